@@ -2,19 +2,46 @@
 # SPDX-License-Identifier: MIT-0
 
 # Usage:
-# python3 src/asset_hierarchy.py --asset-id <value> [--all-levels]
+# python3 src/asset_hierarchy.py --asset-id <value> [--all-levels] [--max-depth <value>] [--concurrency <value>] [--export <value>] [--report] [--time-budget <value>] [--estimate]
+# python3 src/asset_hierarchy.py --all-assets [--all-levels] [--max-depth <value>] [--concurrency <value>] [--export <value>] [--report] [--time-budget <value>] [--estimate]
+# python3 src/asset_hierarchy.py --ancestor-paths <value> [--concurrency <value>] [--report] [--estimate]
+# python3 src/asset_hierarchy.py --resume <value> [--concurrency <value>] [--report] [--time-budget <value>]
 #
 # Example:
 # python3 src/asset_hierarchy.py --asset-id 066e9d16-b369-42fc-abf4-95ae81778b2c
 # python3 src/asset_hierarchy.py --asset-id 2c8249d7-9391-4b66-a50d-7b311ea37aec --all-levels
+# python3 src/asset_hierarchy.py --asset-id 2c8249d7-9391-4b66-a50d-7b311ea37aec --all-levels --max-depth 3 --concurrency 20
+# python3 src/asset_hierarchy.py --asset-id 2c8249d7-9391-4b66-a50d-7b311ea37aec --all-levels --export jsonl
+# python3 src/asset_hierarchy.py --asset-id 2c8249d7-9391-4b66-a50d-7b311ea37aec --all-levels --report
+# python3 src/asset_hierarchy.py --asset-id 2c8249d7-9391-4b66-a50d-7b311ea37aec --all-levels --export csv --time-budget 3600
+# python3 src/asset_hierarchy.py --all-assets --all-levels --concurrency 20 --time-budget 3600
+# python3 src/asset_hierarchy.py --all-assets --all-levels --concurrency 20 --estimate
+# python3 src/asset_hierarchy.py --ancestor-paths alarm_asset_ids.txt
+# cat alarm_asset_ids.txt | python3 src/asset_hierarchy.py --ancestor-paths -
+# python3 src/asset_hierarchy.py --resume exported_data/hierarchy_2c8249d7-9391-4b66-a50d-7b311ea37aec_1693801432_checkpoint.json
 
-import boto3
 import time
 import argparse
 import uuid
+import csv
+import json
+import os
+import random
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from request_pacing import create_client
+from hierarchy_traversal import HierarchyTraversal, ForestCrawl, AncestorResolver, DEFAULT_CONCURRENCY, iter_hierarchy_edges
+from model_catalog import ModelCatalog, summary_from_response
+from instrumentation import report_on_exit
+from checkpoint import Checkpointer, TimeBudgetExhausted, load_checkpoint
+from cost_estimate import ESTIMATE_SAMPLE_SIZE, operation_calls, add_calls, estimate_hierarchy_calls, estimate_workload, print_estimate
 
-sw_client = boto3.client('iotsitewise')
-SCRIPT_TIMEOUT_SECONDS = 60
+src_dir = os.path.abspath(os.path.dirname(__file__))
+root_dir = os.path.abspath(os.path.dirname(src_dir))
+
+SCRIPT_TIMEOUT_SECONDS = 60 # Default time budget of a run
+DATA_EXPORT_FOLDER_NAME = 'exported_data'
+EXPORT_FORMATS = ['jsonl', 'csv']
 
 # Validate if the provided value is a valid UUID
 def valid_uuid(value):
@@ -24,60 +51,104 @@ def valid_uuid(value):
     except ValueError:
         return False
 
-# Retrieve all associated assets for a given asset and hierarchy
-def list_associated_assets(asset_id, hierarchy_id):
-    all_associated_assets = []
-    next_token = None
-    # Paginate
-    while True:
-        if next_token:
-            response = sw_client.list_associated_assets(assetId=asset_id,hierarchyId=hierarchy_id, nextToken=next_token)
-        else:
-            response = sw_client.list_associated_assets(assetId=asset_id,hierarchyId=hierarchy_id)
-        associated_assets = response['assetSummaries']
-        all_associated_assets += associated_assets
-        # Check if there are more pages of results
-        if 'nextToken' in response:
-            next_token = response['nextToken']
-        else:
-            break   
-        time.sleep(1) 
-    return all_associated_assets
-
-# Get name of an asset
-def get_asset_name(asset_id):
-    asset_name = None
-    response = sw_client.describe_asset(assetId=asset_id,excludeProperties=True)
-    asset_name = response['assetName']
-    return asset_name
-
-# Retrieve all child assets for a given asset
-def get_child_assets(asset_id):
-    child_assets = []
-    response = sw_client.describe_asset(assetId=asset_id,excludeProperties=True)
-    asset_hierarchies = response['assetHierarchies']
-    for hierarchy in asset_hierarchies:
-        hierarchy_id = hierarchy['id']
-        associated_assets = list_associated_assets(asset_id,hierarchy_id)
-        child_assets += associated_assets
-        time.sleep(1)
-    return child_assets
-
 # Print hierarchy
 def print_hierarchy(child_assets, hierarchy_level):
-    elapsed_time = time.time() - script_start_time
-    if elapsed_time > SCRIPT_TIMEOUT_SECONDS:
-        raise Exception("Script execution timeout reached!")
     for child_asset in child_assets:
-        child_asset_name = child_asset['name']
-        child_asset_id = child_asset['id']
+        child_asset_name = child_asset.name
+        child_asset_id = child_asset.asset_id
         position = 3 * (hierarchy_level-2)
         spaces = " " * position
         print(f'{spaces}|__ Asset Name: {child_asset_name}, Asset Id: {child_asset_id}')
-        if not include_all_levels: continue
-        next_level_child_assets = get_child_assets(child_asset_id)
-        if len(next_level_child_assets)>0:
-            print_hierarchy(next_level_child_assets, hierarchy_level+1)
+        if len(child_asset.children)>0:
+            print_hierarchy(child_asset.children, hierarchy_level+1)
+
+# Write hierarchy edges to a JSONL or CSV file as they are generated, returns the number of edges.
+# With a checkpointer, the traversal state and the size of the file are saved along the edges,
+# a resumed export drops the edges written after its checkpoint and appends to the file.
+def export_hierarchy(edges, file_path, export_format, checkpointer=None, state=None):
+    if state is None: state = {}
+    edge_count = state.get('edgeCount', 0)
+    resumed = 'fileOffset' in state
+    with open(file_path, mode='r+' if resumed else 'w', newline='') as export_file:
+        csv_writer = csv.writer(export_file)
+        if resumed:
+            export_file.truncate(state['fileOffset'])
+            export_file.seek(state['fileOffset'])
+        elif export_format == 'csv':
+            csv_writer.writerow(['Parent Asset ID', 'Asset ID', 'Asset Name', 'Asset Model ID', 'Hierarchy ID', 'Depth'])
+
+        # State of the traversal and size of the file written so far
+        def checkpoint_state():
+            export_file.flush()
+            state['fileOffset'] = export_file.tell()
+            state['edgeCount'] = edge_count
+            return state
+
+        for edge in edges:
+            if export_format == 'csv':
+                csv_writer.writerow(edge.values())
+            else:
+                export_file.write(json.dumps(edge) + '\n')
+            edge_count += 1
+            if checkpointer: checkpointer.check(checkpoint_state)
+    return edge_count
+
+# Read asset IDs from a file or from stdin ("-"), one ID per line, duplicates are ignored
+def read_asset_ids(file_path):
+    asset_ids_file = sys.stdin if file_path == '-' else open(file_path)
+    asset_ids = list(dict.fromkeys(line.strip() for line in asset_ids_file if line.strip()))
+    if asset_ids_file is not sys.stdin: asset_ids_file.close()
+    for asset_id in asset_ids:
+        if not valid_uuid(asset_id): raise Exception(f"\nInvalid Asset ID: {asset_id}!")
+    return asset_ids
+
+# Write the path of each asset from its root asset to a CSV file, assets that do not exist have an empty path
+def export_paths(paths, file_path):
+    with open(file_path, mode='w', newline='') as csv_file:
+        csv_writer = csv.writer(csv_file)
+        csv_writer.writerow(['Asset ID', 'Asset Name', 'Depth', 'Root Asset ID', 'Path', 'Path IDs'])
+        for asset_id, asset_name, path_ids, path_names in paths:
+            if path_ids is None:
+                csv_writer.writerow([asset_id, '', '', '', '', ''])
+            else:
+                csv_writer.writerow([asset_id, asset_name, len(path_ids), path_ids[0], ' / '.join(path_names), ' / '.join(path_ids)])
+
+# Print the number of crawled assets per depth and per model
+def print_forest_counts(state, models):
+    print(f'\nAssets per depth:')
+    for depth, asset_count in enumerate(state['depthCounts']):
+        print(f'\tDepth {depth+1}: {asset_count}')
+    print(f'\nAssets per model:')
+    for model in models:
+        if model.id in state['assetCounts']:
+            print(f'\tModel Name: {model.name}, Model Id: {model.id}, Assets: {state["assetCounts"][model.id]}')
+
+# Predict the API calls of the hierarchy of an asset, from the first levels below the asset.
+# Returns the predicted calls per operation and the predicted number of assets.
+def estimate_asset_hierarchy(client, asset_id, max_depth):
+    response = client.describe_asset(assetId=asset_id, excludeProperties=True)
+    calls = operation_calls(client)
+    list_call_count, asset_count = estimate_hierarchy_calls(client, ModelCatalog(client), [(asset_id, response['assetModelId'])], 1, max_depth)
+    return add_calls(calls, {'list_associated_assets': list_call_count}), asset_count
+
+# Predict the API calls of the crawl of all hierarchies, from the root assets of all models and the first levels below a sample of them.
+# The root assets of every model are listed concurrently, as by the crawl, as few models have root assets.
+# Returns the predicted calls per operation and the predicted number of assets.
+def estimate_forest(client, models, max_depth, concurrency=DEFAULT_CONCURRENCY):
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        model_roots = list(executor.map(lambda model: client.paginate('list_assets', 'assetSummaries', assetModelId=model.id, filter='TOP_LEVEL'), models))
+    roots = [(asset['id'], asset['assetModelId']) for assets in model_roots for asset in assets]
+    calls = operation_calls(client)
+    list_call_count, asset_count = estimate_hierarchy_calls(client, ModelCatalog(client), random.sample(roots, min(ESTIMATE_SAMPLE_SIZE, len(roots))),
+                                                            len(roots), max_depth)
+    return add_calls(calls, {'list_associated_assets': list_call_count}), asset_count
+
+# Predict the API calls of the ancestor paths of the given assets, from the paths of a sample of assets.
+# Assets of a larger run share more ancestors, so the prediction is an upper bound.
+def estimate_ancestor_paths(client, asset_ids, concurrency):
+    sample = random.sample(asset_ids, min(ESTIMATE_SAMPLE_SIZE, len(asset_ids)))
+    AncestorResolver(client, concurrency).resolve(sample)
+    return add_calls({}, operation_calls(client), len(asset_ids) / len(sample) if sample else 0)
 
 if __name__ == "__main__":
     script_start_time = time.time()
@@ -85,18 +156,117 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     # Add the arguments
     parser.add_argument("--asset-id", help="ID of the asset")
+    parser.add_argument("--all-assets", help="Export the hierarchies of all root assets of all models", action="store_true")
+    parser.add_argument("--ancestor-paths", help="File listing asset IDs, one per line, to export the path of each asset from its root asset, - to read from stdin")
     parser.add_argument("--all-levels", help="Include all levels in the hierarchy", action="store_true")
+    parser.add_argument("--max-depth", help="Maximum number of levels below the asset to include with --all-levels", type=int)
+    parser.add_argument("--concurrency", help="Maximum number of concurrent API calls", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--export", help="Stream parent-child edges of the hierarchy to a file instead of printing it", choices=EXPORT_FORMATS)
+    parser.add_argument("--report", help="Export a report of the API calls made by the script", action="store_true")
+    parser.add_argument("--time-budget", help="Maximum run time in seconds, the run is checkpointed and stops when reached", type=int, default=SCRIPT_TIMEOUT_SECONDS)
+    parser.add_argument("--resume", help="Checkpoint file of a previous run to resume")
+    parser.add_argument("--estimate", help="Predict the API calls and the run time from a sample, without crawling the hierarchies", action="store_true")
     # Parse the arguments
     args = parser.parse_args()
-    # Access the arguments
-    asset_id = args.asset_id
-    include_all_levels = args.all_levels
+    # Access the arguments, a resumed run continues with the options of the checkpointed run
+    state = None
+    ancestor_paths_file_path = None
+    if args.resume:
+        state = load_checkpoint(args.resume)
+        asset_id = state.get('assetId')
+        all_assets = state.get('allAssets', False)
+        max_depth = state['maxDepth']
+        export_format = state.get('export')
+    else:
+        asset_id = args.asset_id
+        all_assets = args.all_assets
+        ancestor_paths_file_path = args.ancestor_paths
+        max_depth = args.max_depth if args.all_levels else 1
+        # The forest of all assets is always exported
+        export_format = args.export if args.export or not all_assets else 'csv'
+    concurrency = args.concurrency
     # Validate the arguments
-    if valid_uuid(asset_id):
+    if (max_depth is not None and max_depth < 1) or concurrency < 1:
+        raise Exception("\nMaximum depth and concurrency must be at least 1!")
+    if bool(asset_id) + all_assets + bool(ancestor_paths_file_path) > 1:
+        raise Exception("\nProvide only one of an Asset ID, --all-assets or --ancestor-paths!")
+    if args.estimate and args.resume:
+        raise Exception("\n--estimate cannot be combined with --resume!")
+    if ancestor_paths_file_path:
+        ancestor_asset_ids = read_asset_ids(ancestor_paths_file_path)
+    if all_assets or ancestor_paths_file_path or valid_uuid(asset_id):
         print(f'\nUser input successfully validated')
     else:
         raise Exception("\nInvalid Asset ID!")
-    asset_name = get_asset_name(asset_id)
-    child_assets = get_child_assets(asset_id)
-    print(f'\nAsset Name: {asset_name}, Asset Id: {asset_id}')
-    print_hierarchy(child_assets,2)
\ No newline at end of file
+    file_path = f'{root_dir}/{DATA_EXPORT_FOLDER_NAME}/hierarchy_{"forest" if all_assets else asset_id}_{int(time.time())}'
+    if ancestor_paths_file_path:
+        file_path = f'{root_dir}/{DATA_EXPORT_FOLDER_NAME}/asset_paths_{int(time.time())}'
+    checkpoint_file_path = args.resume if args.resume else f'{file_path}_checkpoint.json'
+    sw_client = create_client(concurrency)
+    if args.report:
+        report_on_exit(sw_client, f'{file_path}_report.json', script_start_time)
+    if args.estimate:
+        if ancestor_paths_file_path:
+            print(f'\nResolving the paths of a sample of {min(ESTIMATE_SAMPLE_SIZE, len(ancestor_asset_ids))} of {len(ancestor_asset_ids)} assets..')
+            calls = estimate_ancestor_paths(sw_client, ancestor_asset_ids, concurrency)
+            description = f'the paths of {len(ancestor_asset_ids)} assets'
+        elif all_assets:
+            models = [summary_from_response(model_summary) for model_summary in sw_client.iterate('list_asset_models', 'assetModelSummaries')]
+            print(f'\nListing the root assets of {len(models)} models and sampling their hierarchies..')
+            calls, asset_count = estimate_forest(sw_client, models, max_depth, concurrency)
+            description = f'the crawl of about {asset_count} assets'
+        else:
+            print(f'\nSampling the first levels of the hierarchy..')
+            calls, asset_count = estimate_asset_hierarchy(sw_client, asset_id, max_depth)
+            description = f'the hierarchy of about {asset_count} assets'
+        # The streaming export of a single hierarchy makes one call at a time
+        estimate_concurrency = 1 if export_format and not all_assets and not ancestor_paths_file_path else concurrency
+        print_estimate(estimate_workload(sw_client, calls, estimate_concurrency), f'{description} with {estimate_concurrency} concurrent calls')
+        raise SystemExit(0)
+    if ancestor_paths_file_path:
+        # Paths are resolved in one pass, without time budget nor checkpoint
+        print(f'\nResolving the paths of {len(ancestor_asset_ids)} assets..')
+        resolver = AncestorResolver(sw_client, concurrency)
+        paths = resolver.resolve(ancestor_asset_ids)
+        file_path = f'{file_path}.csv'
+        export_paths(paths, file_path)
+        missing_asset_ids = [asset_id for asset_id, asset_name, path_ids, path_names in paths if path_ids is None]
+        ancestor_count = len({path_id for asset_id, asset_name, path_ids, path_names in paths for path_id in (path_ids or [])[:-1]})
+        if missing_asset_ids:
+            print(f'\nAssets not found, exported with an empty path: {", ".join(missing_asset_ids)}')
+        print(f'\nExported the paths of {len(paths) - len(missing_asset_ids)} assets with {ancestor_count} distinct ancestors to {file_path}')
+        raise SystemExit(0)
+    checkpointer = Checkpointer(checkpoint_file_path, args.time_budget, script_start_time)
+    try:
+        if all_assets:
+            if state is None:
+                state = {'allAssets': True, 'maxDepth': max_depth, 'export': export_format, 'filePath': f'{file_path}.{export_format}'}
+            file_path = state['filePath']
+            models = [summary_from_response(model_summary) for model_summary in sw_client.iterate('list_asset_models', 'assetModelSummaries')]
+            print(f'\nCrawling the asset hierarchies of {len(models)} models..')
+            edges = ForestCrawl(sw_client, concurrency, max_depth).iter_edges([model.id for model in models], state)
+            edge_count = export_hierarchy(edges, file_path, export_format, checkpointer, state)
+            print_forest_counts(state, models)
+            print(f'\nExported {edge_count} assets to {file_path}')
+        elif export_format:
+            if state is None:
+                state = {'assetId': asset_id, 'maxDepth': max_depth, 'export': export_format, 'filePath': f'{file_path}.{export_format}'}
+            file_path = state['filePath']
+            edges = iter_hierarchy_edges(sw_client, asset_id, max_depth, state)
+            edge_count = export_hierarchy(edges, file_path, export_format, checkpointer, state)
+            print(f'\nExported {edge_count} hierarchy edges to {file_path}')
+        else:
+            traversal = HierarchyTraversal(sw_client, concurrency, max_depth, checkpointer)
+            root_asset = traversal.run(asset_id, state)
+            print(f'\nAsset Name: {root_asset.name}, Asset Id: {asset_id}')
+            print_hierarchy(root_asset.children,2)
+    except TimeBudgetExhausted as error:
+        print(f'\n{error}')
+        print(f'Resume with: python3 src/asset_hierarchy.py --resume "{error.checkpoint_file_path}"')
+        raise SystemExit(1)
+    except BaseException:
+        # A run stopped by an error or an interrupt resumes from its last periodic checkpoint
+        if os.path.exists(checkpoint_file_path):
+            print(f'\nResume with: python3 src/asset_hierarchy.py --resume "{checkpoint_file_path}"')
+        raise
+    checkpointer.remove()
@@ -0,0 +1,267 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# Usage:
+# python3 src/benchmark.py [--models <value>] [--depth <value>] [--fan-out <value>] [--metrics <value>] [--latency <value>] [--throttle-rate <value>] [--workers <value>] [--concurrency <value>] [--no-pacing] [--seed <value>] [--memory]
+#
+# Examples:
+# python3 src/benchmark.py
+# python3 src/benchmark.py --models 1000 --latency 0.02 --throttle-rate 0.05 --workers 16
+# python3 src/benchmark.py --models 10000 --no-pacing --memory
+
+import os
+import time
+import argparse
+import contextlib
+import csv
+import io
+import json
+import random
+import tracemalloc
+import search_models
+import model_references
+import asset_hierarchy
+from fake_sitewise import FakeSiteWiseClient, generate_account, generate_diamond_account
+from request_pacing import PacedClient
+from rate_limiter import API_RATE_LIMITS
+from model_catalog import ModelCatalog, summary_from_response
+from dependency_graph import DependencyGraph
+from hierarchy_traversal import HierarchyTraversal, ForestCrawl, AncestorResolver, DEFAULT_CONCURRENCY, iter_hierarchy_edges
+
+src_dir = os.path.abspath(os.path.dirname(__file__))
+root_dir = os.path.abspath(os.path.dirname(src_dir))
+
+DATA_EXPORT_FOLDER_NAME = 'exported_data'
+UNPACED_RATE_LIMIT = 1000000
+ANCESTOR_PATHS_ASSET_COUNT = 1000
+THROTTLING_CHECK_RATE = 0.2 # Share of calls throttled by the benchmark checking the throttles of the report
+
+# Filter models with search_models.py, returns the number of filtered models
+def benchmark_filter_models(client, filters, workers):
+    search_models.sw_client = client
+    search_models.model_catalog = ModelCatalog(client)
+    return len(search_models.filter_models(*filters, workers))
+
+# Point model_references.py to the client and build its map of parent models
+def setup_model_references(client):
+    model_references.sw_client = client
+    model_references.model_catalog = ModelCatalog(client)
+    model_references.dependency_graph = DependencyGraph(model_references.model_catalog)
+    model_references.build_parent_models_map(model_references.list_models())
+
+# Find references of a model with model_references.py, returns the number of references
+def benchmark_model_references(client, model_id):
+    setup_model_references(client)
+    return model_references.get_references(model_id, io.StringIO())
+
+# Find references of several models in one batch with model_references.py, returns the number of references
+def benchmark_batch_references(client, model_ids, workers):
+    setup_model_references(client)
+    return model_references.get_batch_references(model_ids, io.StringIO(), workers)
+
+# Rows of the references of a model found by the recursive search of the first release, which follows every path
+def baseline_references(model_id, reference_level=1, lower_level_properties=[]):
+    rows = []
+    if reference_level == 1:
+        for page in model_references.sw_client.iterate_pages('list_assets', 'assetSummaries', assetModelId=model_id):
+            rows += [[1, 'Asset', asset['name'], asset['id'], '', '', '', '', '', '', '', ''] for asset in page]
+    for hierarchy in model_references.get_hierarchy_references(model_id):
+        if reference_level == 1:
+            rows.append([reference_level, 'Hierarchy Definition', '', '', hierarchy['hierarchyName'], hierarchy['hierarchyId'], hierarchy['assetModelName'], hierarchy['assetModelId'], '', '', '', ''])
+        properties = model_references.extract_dependent_properties(hierarchy['assetModelId'], hierarchy['hierarchyId'], lower_level_properties)
+        for property in properties:
+            rows.append([reference_level+1, 'Property', '', '', hierarchy['hierarchyName'], hierarchy['hierarchyId'], hierarchy['assetModelName'], hierarchy['assetModelId'],
+                         property['propertyName'], property['propertyId'], property['propertyType'], property['propertyDependentOn']])
+        if len(properties) > 0: rows += baseline_references(hierarchy['assetModelId'], reference_level+1, properties)
+    return rows
+
+# Find references of a model reached through several paths, and check the rows against those of the recursive search.
+# Returns the number of references.
+def benchmark_diamond_references(client, model_id):
+    setup_model_references(client)
+    csv_buffer = io.StringIO(newline='')
+    reference_count = model_references.get_references(model_id, csv_buffer)
+    rows = list(csv.reader(io.StringIO(csv_buffer.getvalue(), newline='')))
+    baseline_rows = [[str(value) for value in row] for row in baseline_references(model_id)]
+    if rows != baseline_rows:
+        raise Exception(f"\nget_references wrote {len(rows)} rows, the recursive search finds {len(baseline_rows)} rows!")
+    return reference_count
+
+# Count the assets of a tree built by the level-parallel traversal
+def benchmark_hierarchy_traversal(client, asset_id, concurrency):
+    asset_count = 0
+    level = [HierarchyTraversal(client, concurrency).run(asset_id)]
+    while level:
+        asset_count += len(level)
+        level = [child for node in level for child in node.children]
+    return asset_count
+
+# Count the edges generated by the streaming hierarchy export
+def benchmark_hierarchy_export(client, asset_id):
+    return sum(1 for edge in iter_hierarchy_edges(client, asset_id))
+
+# Count the assets of all hierarchies of the account found by the forest crawl
+def benchmark_forest_crawl(client, model_ids, concurrency):
+    return sum(1 for edge in ForestCrawl(client, concurrency).iter_edges(model_ids, {}))
+
+# Count the assets whose path from their root asset is resolved
+def benchmark_ancestor_paths(client, asset_ids, concurrency):
+    return len(AncestorResolver(client, concurrency).resolve(asset_ids))
+
+# Calls per operation predicted by a workload estimate
+def predicted_calls(estimate):
+    return {operation: metrics['calls'] for operation, metrics in estimate['operations'].items()}
+
+# Predict the calls of filter_models with search_models.py --estimate
+def benchmark_filter_models_estimate(client, filters, workers):
+    search_models.sw_client = client
+    search_models.model_catalog = ModelCatalog(client)
+    estimate, model_count = search_models.estimate_filter_models(*filters, workers)
+    return predicted_calls(estimate)
+
+# Predict the calls of get_references with model_references.py --estimate
+def benchmark_references_estimate(client, model_id):
+    model_references.sw_client = client
+    model_references.model_catalog = ModelCatalog(client)
+    estimate, paged_model_count = model_references.estimate_references([model_id])
+    return predicted_calls(estimate)
+
+# Predict the calls of the hierarchy of an asset with asset_hierarchy.py --estimate
+def benchmark_hierarchy_estimate(client, asset_id):
+    calls, asset_count = asset_hierarchy.estimate_asset_hierarchy(client, asset_id, None)
+    return {operation: round(call_count) for operation, call_count in calls.items()}
+
+# Predict the calls of the forest crawl with asset_hierarchy.py --all-assets --estimate
+def benchmark_forest_estimate(client, concurrency):
+    models = [summary_from_response(model_summary) for model_summary in client.iterate('list_asset_models', 'assetModelSummaries')]
+    calls, asset_count = asset_hierarchy.estimate_forest(client, models, None, concurrency)
+    # The crawl is given the model IDs, it does not list the models
+    calls.pop('list_asset_models', None)
+    return {operation: round(call_count) for operation, call_count in calls.items()}
+
+# Predict the calls of the ancestor paths of assets with asset_hierarchy.py --ancestor-paths --estimate
+def benchmark_ancestor_paths_estimate(client, asset_ids, concurrency):
+    calls = asset_hierarchy.estimate_ancestor_paths(client, asset_ids, concurrency)
+    return {operation: round(call_count) for operation, call_count in calls.items()}
+
+# Calls per operation made by a benchmark, without the throttled calls
+def measured_calls(result):
+    return {operation: call_count - result['throttles'].get(operation, 0) for operation, call_count in result['apiCalls'].items()}
+
+# Run a benchmark against a new fake client, returns wall time, API calls per operation and optionally the peak memory.
+# The throttles and calls of the report of the client must match those of the fake client.
+def run_benchmark(name, account, args, rate_limits, function, *function_args, throttle_rate=None):
+    fake_client = FakeSiteWiseClient(account, args.latency, args.throttle_rate if throttle_rate is None else throttle_rate, args.seed)
+    client = PacedClient(fake_client, rate_limits)
+    if args.memory: tracemalloc.start()
+    start_time = time.time()
+    # Suppress the progress output of the utilities
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = function(client, *function_args)
+    wall_time = time.time() - start_time
+    peak_memory = None
+    if args.memory:
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    reported_operations = client.metrics.report()['operations']
+    for operation in set(reported_operations) | set(fake_client.calls):
+        metrics = reported_operations.get(operation, {'calls': 0, 'throttles': 0})
+        if metrics['throttles'] != fake_client.throttles[operation] or metrics['calls'] != fake_client.calls[operation]:
+            raise Exception(f"\n{name}: the report holds {metrics['calls']} calls and {metrics['throttles']} throttles of {operation}, "
+                            f"the fake client received {fake_client.calls[operation]} calls and throttled {fake_client.throttles[operation]}!")
+    return {'benchmark': name,
+            'wallTimeSeconds': round(wall_time, 3),
+            'peakMemoryBytes': peak_memory,
+            'result': result,
+            'apiCalls': dict(fake_client.calls),
+            'throttles': dict(fake_client.throttles),
+            'report': client.metrics.report()['totals']}
+
+# Find a model by name
+def model_id_from_name(account, model_name):
+    for model_id, model in account.models.items():
+        if model['assetModelName'] == model_name: return model_id
+    return None
+
+if __name__ == "__main__":
+    # Create the argument parser
+    parser = argparse.ArgumentParser()
+    # Add the arguments
+    parser.add_argument("--models", help="Number of models in the synthetic account", type=int, default=100)
+    parser.add_argument("--depth", help="Number of levels of the model hierarchy", type=int, default=4)
+    parser.add_argument("--fan-out", help="Number of child assets per asset hierarchy", type=int, default=3)
+    parser.add_argument("--metrics", help="Number of roll-up metrics per model hierarchy", type=int, default=2)
+    parser.add_argument("--latency", help="Latency of each API call in seconds", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", help="Share of API calls throttled, between 0 and 1", type=float, default=0.0)
+    parser.add_argument("--workers", help="Number of models analyzed concurrently by search_models.py", type=int, default=1)
+    parser.add_argument("--concurrency", help="Maximum number of concurrent API calls of the hierarchy traversal", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--no-pacing", help="Do not pace API calls to the SiteWise quotas", action="store_true")
+    parser.add_argument("--seed", help="Seed of the synthetic account", type=int, default=1)
+    parser.add_argument("--memory", help="Measure the peak memory allocated by each benchmark, this slows down the benchmarks", action="store_true")
+    # Parse the arguments
+    args = parser.parse_args()
+    # Validate the arguments
+    if args.models < args.depth or args.depth < 2:
+        raise Exception("\nThe synthetic account needs at least 2 levels and one model per level!")
+
+    account = generate_account(args.models, args.depth, args.fan_out, args.metrics, args.seed)
+    print(f'\nSynthetic account: {len(account.models)} models, {len(account.assets)} assets, {len(account.root_asset_ids)} root assets')
+    rate_limits = {operation: UNPACED_RATE_LIMIT for operation in API_RATE_LIMITS} if args.no_pacing else API_RATE_LIMITS
+    lowest_level_model_id = model_id_from_name(account, f'Model L{args.depth}-1')
+    lowest_level_model_ids = [model_id for model_id, model in account.models.items() if model['assetModelName'].startswith(f'Model L{args.depth}-')]
+    diamond_account = generate_diamond_account(seed=args.seed)
+    root_asset_id = account.root_asset_ids[0]
+    child_asset_ids = list(account.parent_assets)[:ANCESTOR_PATHS_ASSET_COUNT]
+
+    results = [
+        run_benchmark('filter_models (no filters)', account, args, rate_limits, benchmark_filter_models, (False, False, False, False), args.workers),
+        run_benchmark('filter_models --no-properties --no-assets', account, args, rate_limits, benchmark_filter_models, (False, False, True, True), args.workers),
+        run_benchmark('filter_models (all filters)', account, args, rate_limits, benchmark_filter_models, (True, True, True, True), args.workers),
+        run_benchmark(f'filter_models (all filters), {round(THROTTLING_CHECK_RATE * 100)}% of calls throttled', account, args, rate_limits, benchmark_filter_models,
+                      (True, True, True, True), args.workers, throttle_rate=THROTTLING_CHECK_RATE),
+        run_benchmark('get_references', account, args, rate_limits, benchmark_model_references, lowest_level_model_id),
+        run_benchmark('get_references of a chain of diamonds', diamond_account, args, rate_limits, benchmark_diamond_references, next(iter(diamond_account.models))),
+        run_benchmark(f'get_batch_references of {len(lowest_level_model_ids)} models', account, args, rate_limits, benchmark_batch_references, lowest_level_model_ids, args.workers),
+        run_benchmark('hierarchy traversal --all-levels', account, args, rate_limits, benchmark_hierarchy_traversal, root_asset_id, args.concurrency),
+        run_benchmark('hierarchy export --all-levels', account, args, rate_limits, benchmark_hierarchy_export, root_asset_id),
+        run_benchmark('forest crawl --all-assets --all-levels', account, args, rate_limits, benchmark_forest_crawl, list(account.models), args.concurrency),
+        run_benchmark(f'ancestor paths of {len(child_asset_ids)} assets', account, args, rate_limits, benchmark_ancestor_paths, child_asset_ids, args.concurrency)
+    ]
+
+    # Each --estimate dry run is compared with the run it predicts, samples are drawn from the seed
+    random.seed(args.seed)
+    measured_results = {result['benchmark']: result for result in results}
+    estimates = [
+        (run_benchmark('search_models.py --no-properties --no-assets --estimate', account, args, rate_limits, benchmark_filter_models_estimate, (False, False, True, True), args.workers),
+         'filter_models --no-properties --no-assets'),
+        (run_benchmark('model_references.py --estimate', account, args, rate_limits, benchmark_references_estimate, lowest_level_model_id), 'get_references'),
+        (run_benchmark('asset_hierarchy.py --all-levels --estimate', account, args, rate_limits, benchmark_hierarchy_estimate, root_asset_id), 'hierarchy traversal --all-levels'),
+        (run_benchmark('asset_hierarchy.py --all-assets --all-levels --estimate', account, args, rate_limits, benchmark_forest_estimate, args.concurrency),
+         'forest crawl --all-assets --all-levels'),
+        (run_benchmark('asset_hierarchy.py --ancestor-paths --estimate', account, args, rate_limits, benchmark_ancestor_paths_estimate, child_asset_ids, args.concurrency),
+         f'ancestor paths of {len(child_asset_ids)} assets')
+    ]
+    for estimate, measured_name in estimates:
+        estimate['measuredBenchmark'] = measured_name
+        estimate['measuredCalls'] = measured_calls(measured_results[measured_name])
+
+    print(f'\nBenchmark results:')
+    for result in results:
+        print(f'\t{result["benchmark"]}: {result["wallTimeSeconds"]} seconds, result: {result["result"]}')
+        if args.memory: print(f'\t\tpeak memory: {round(result["peakMemoryBytes"] / 1024 / 1024, 1)} MiB')
+        for operation, call_count in sorted(result['apiCalls'].items()):
+            print(f'\t\t{operation}: {call_count} calls, {result["throttles"].get(operation, 0)} throttled')
+
+    print(f'\nEstimates versus measured runs:')
+    for estimate, measured_name in estimates:
+        print(f'\t{estimate["benchmark"]} versus {measured_name}:')
+        for operation in sorted(set(estimate['result']) | set(estimate['measuredCalls'])):
+            predicted_count = estimate['result'].get(operation, 0)
+            measured_count = estimate['measuredCalls'].get(operation, 0)
+            ratio = f' ({round(predicted_count / measured_count, 2)}x)' if measured_count else ''
+            print(f'\t\t{operation}: {predicted_count} calls predicted, {measured_count} measured{ratio}')
+
+    file_path = f'{root_dir}/{DATA_EXPORT_FOLDER_NAME}/benchmark_{int(time.time())}.json'
+    with open(file_path, mode='w') as json_file:
+        json.dump({'parameters': vars(args), 'results': results, 'estimates': [estimate for estimate, measured_name in estimates]}, json_file, indent=2)
+    print(f'\nExported benchmark results to {file_path}')
@@ -0,0 +1,68 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+import os
+import time
+
+CHECKPOINT_INTERVAL_SECONDS = 30
+
+# Raised when the time budget of a run is exhausted, after its state was saved to the checkpoint file
+class TimeBudgetExhausted(Exception):
+    def __init__(self, checkpoint_file_path):
+        super().__init__(f'Time budget reached, checkpoint saved to {checkpoint_file_path}')
+        self.checkpoint_file_path = checkpoint_file_path
+
+# Time budget of the tasks of a checkpointed run whose state is saved by the run, not by the tasks.
+# Tasks stop when the time budget is exhausted, without saving their state.
+class BudgetCheck:
+    def __init__(self, checkpointer):
+        self.checkpointer = checkpointer
+
+    # Stop the task when the time budget is exhausted, state_function is ignored
+    def check(self, state_function):
+        if time.time() > self.checkpointer.deadline:
+            raise TimeBudgetExhausted(self.checkpointer.file_path)
+
+# Load the state saved in a checkpoint file
+def load_checkpoint(file_path):
+    with open(file_path) as checkpoint_file:
+        return json.load(checkpoint_file)
+
+# Periodically save the state of a long running traversal, and stop it when its time budget is exhausted.
+# A run stopped by an error or an interrupt resumes from its last periodic checkpoint, the checkpoint is removed once the run completes.
+class Checkpointer:
+    def __init__(self, file_path, time_budget, start_time=None, interval=CHECKPOINT_INTERVAL_SECONDS):
+        self.file_path = file_path
+        self.deadline = (start_time if start_time else time.time()) + time_budget
+        self.interval = interval
+        self.last_save_time = time.time()
+        self.shared_state_functions = []
+
+    # Write the state to a temporary file first, so that an interrupted save keeps the previous checkpoint.
+    # Queues (deque) of the state are saved as lists.
+    def save(self, state):
+        temp_file_path = f'{self.file_path}.tmp'
+        with open(temp_file_path, mode='w') as checkpoint_file:
+            json.dump(state, checkpoint_file, default=list)
+        os.replace(temp_file_path, self.file_path)
+        self.last_save_time = time.time()
+
+    # Add the entries returned by function to every saved state, for state shared by the stages of a run
+    def share_state(self, function):
+        self.shared_state_functions.append(function)
+
+    # Save the state returned by state_function when the interval elapsed, and stop the run when the time budget is exhausted
+    def check(self, state_function):
+        now = time.time()
+        exhausted = now > self.deadline
+        if exhausted or now - self.last_save_time > self.interval:
+            state = state_function()
+            for function in self.shared_state_functions: state.update(function())
+            self.save(state)
+        if exhausted:
+            raise TimeBudgetExhausted(self.file_path)
+
+    # Remove the checkpoint file once the run is complete
+    def remove(self):
+        if os.path.exists(self.file_path): os.remove(self.file_path)
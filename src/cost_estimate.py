@@ -0,0 +1,103 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import random
+from collections import Counter
+from rate_limiter import API_RATE_LIMITS
+
+ESTIMATE_SAMPLE_SIZE = 20 # Models or assets analyzed by a dry run, per sampled level for hierarchies
+ESTIMATE_SAMPLE_LEVELS = 2 # Hierarchy levels expanded by a dry run, deeper levels are extrapolated
+MAX_ESTIMATE_DEPTH = 20 # Deepest hierarchy level extrapolated when no maximum depth is given
+DEFAULT_LATENCY_SECONDS = 0.1 # Latency of operations not called by the sample
+
+# Calls made through a client so far, per operation
+def operation_calls(client):
+    return {operation: metrics['calls'] for operation, metrics in client.metrics.report()['operations'].items()}
+
+# Calls made through a client since the given per-operation counts
+def calls_since(client, previous_calls):
+    return {operation: calls - previous_calls.get(operation, 0) for operation, calls in operation_calls(client).items()
+            if calls > previous_calls.get(operation, 0)}
+
+# Sum per-operation call counts, each multiplied by its factor
+def add_calls(calls, other_calls, factor=1):
+    total_calls = dict(calls)
+    for operation, call_count in other_calls.items():
+        total_calls[operation] = total_calls.get(operation, 0) + call_count * factor
+    return total_calls
+
+# Predict the wall time and throttling exposure of a workload from its calls per operation.
+# Latencies are those measured by the sample. The workload takes at least its calls times their latency spread over the
+# concurrent calls, and at least the calls of each operation at its quota. Operations whose calls would be made faster
+# than their quota, beyond its initial burst, are paced and exposed to throttling when the quota is shared with other clients of the account.
+def estimate_workload(client, calls, concurrency):
+    report = client.metrics.report()
+    latencies = {operation: metrics['latencySeconds']['p50'] for operation, metrics in report['operations'].items() if metrics['calls']}
+    default_latency = sum(latencies.values()) / len(latencies) if latencies else DEFAULT_LATENCY_SECONDS
+    latency_bound_seconds = sum(call_count * latencies.get(operation, default_latency) for operation, call_count in calls.items()) / concurrency
+    operations = {}
+    for operation, call_count in sorted(calls.items()):
+        quota = API_RATE_LIMITS.get(operation)
+        quota_seconds = call_count / quota if quota else 0.0
+        operations[operation] = {'calls': round(call_count),
+                                 'quota': quota,
+                                 'latencySeconds': round(latencies.get(operation, default_latency), 4),
+                                 'quotaSeconds': round(quota_seconds, 1),
+                                 'throttlingExposure': bool(quota) and call_count > quota and quota_seconds >= latency_bound_seconds,
+                                 'sampleThrottles': report['operations'].get(operation, {}).get('throttles', 0)}
+    quota_bound_seconds = max([operation['quotaSeconds'] for operation in operations.values()], default=0.0)
+    return {'operations': operations,
+            'latencyBoundSeconds': round(latency_bound_seconds, 1),
+            'quotaBoundSeconds': quota_bound_seconds,
+            'wallTimeSeconds': round(max(latency_bound_seconds, quota_bound_seconds), 1),
+            'sampleCalls': report['totals']['calls']}
+
+# Print the predicted calls per operation and wall time of a workload
+def print_estimate(estimate, description):
+    print(f'\nEstimate for {description}:')
+    for operation, metrics in estimate['operations'].items():
+        exposure = ', paced at quota (throttling exposure)' if metrics['throttlingExposure'] else ''
+        print(f'\t{operation}: {metrics["calls"]} calls, quota {metrics["quota"]}/s, at least {metrics["quotaSeconds"]} seconds{exposure}')
+    bound = 'quotas' if estimate['quotaBoundSeconds'] >= estimate['latencyBoundSeconds'] else 'latency'
+    print(f'\tEstimated wall time: {estimate["wallTimeSeconds"]} seconds, bound by {bound}')
+    print(f'\tSample: {estimate["sampleCalls"]} API calls')
+
+# Predict the ListAssociatedAssets calls and the assets of hierarchies below the given root assets.
+# roots are (asset ID, model ID) pairs of a sample of the root_count root assets. The first levels are expanded for a sample of
+# their assets, and deeper levels are extrapolated from the hierarchies of the models with the observed children per hierarchy.
+# Levels are expanded down to max_depth, like the traversals. Returns the predicted calls and the predicted number of assets.
+def estimate_hierarchy_calls(client, model_catalog, roots, root_count, max_depth=None):
+    depth_limit = max_depth if max_depth is not None else MAX_ESTIMATE_DEPTH
+    scale = root_count / len(roots) if roots else 0
+    counts = Counter()
+    for asset_id, model_id in roots: counts[model_id] += scale
+    sample = roots
+    sampled_hierarchy_count = sampled_call_count = sampled_child_count = 0
+    predicted_call_count = 0.0
+    asset_count = root_count
+    depth = 1
+    while counts and depth <= depth_limit:
+        # Expected number of hierarchies of the level, per child model
+        hierarchy_counts = Counter()
+        for model_id, count in counts.items():
+            for hierarchy in model_catalog.describe_without_properties(model_id).hierarchies:
+                hierarchy_counts[hierarchy.child_model_id] += count
+        if sample and depth <= ESTIMATE_SAMPLE_LEVELS:
+            children = []
+            for asset_id, model_id in sample:
+                for hierarchy in model_catalog.describe_without_properties(model_id).hierarchies:
+                    for page in client.iterate_pages('list_associated_assets', 'assetSummaries', assetId=asset_id, hierarchyId=hierarchy.id):
+                        children += [(child['id'], child['assetModelId']) for child in page]
+                        sampled_call_count += 1
+                    sampled_hierarchy_count += 1
+            sampled_child_count += len(children)
+            sample = random.sample(children, min(ESTIMATE_SAMPLE_SIZE, len(children)))
+        else:
+            sample = []
+        if sampled_hierarchy_count == 0: break
+        predicted_call_count += sum(hierarchy_counts.values()) * sampled_call_count / sampled_hierarchy_count
+        children_per_hierarchy = sampled_child_count / sampled_hierarchy_count
+        counts = Counter({model_id: count * children_per_hierarchy for model_id, count in hierarchy_counts.items() if count * children_per_hierarchy > 0})
+        asset_count += sum(counts.values())
+        depth += 1
+    return predicted_call_count, round(asset_count)
@@ -0,0 +1,53 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# Metric property of a model, a node of the dependency graph
+class MetricNode:
+    __slots__ = ('model_id', 'property_id', 'name', 'type_name', 'order', 'dependent_on')
+
+    def __init__(self, model_id, property_id, name, type_name, order):
+        self.model_id = model_id
+        self.property_id = property_id
+        self.name = name
+        self.type_name = type_name
+        self.order = order
+        self.dependent_on = ''
+
+# Property-level dependency graph of all models.
+# Nodes are (model, property) pairs, edges come from the variables of metrics and their hierarchy references.
+class DependencyGraph:
+    def __init__(self, model_catalog):
+        self.model_catalog = model_catalog
+        self.metrics_by_hierarchy = {}
+        self.hierarchy_dependents = {}
+
+    # Add the metrics of a model and the edges from the properties they depend on
+    def add_model(self, model_id):
+        for order, property in enumerate(self.model_catalog.properties(model_id)):
+            if property.type_name != 'metric' or property.variables is None: continue
+            metric = MetricNode(model_id, property.id, property.name, property.type_name, order)
+            hierarchy_ids = []
+            for independent_property_id, hierarchy_id in property.variables:
+                # Property dependent on a property of a lower level model
+                if hierarchy_id:
+                    child_model_id = self.model_catalog.child_model_id(model_id, hierarchy_id)
+                    metric.dependent_on += self.model_catalog.property_name(child_model_id, independent_property_id) + ','
+                    self.hierarchy_dependents.setdefault((model_id, hierarchy_id, independent_property_id), []).append(metric)
+                    if hierarchy_id not in hierarchy_ids: hierarchy_ids.append(hierarchy_id)
+                # Property dependent on a property of the same model
+                else:
+                    metric.dependent_on += self.model_catalog.property_name(model_id, independent_property_id) + ','
+            for hierarchy_id in hierarchy_ids:
+                self.metrics_by_hierarchy.setdefault((model_id, hierarchy_id), []).append(metric)
+
+    # Metrics of a model that roll up properties through the given hierarchy.
+    # Without property IDs, all metrics referencing the hierarchy are returned.
+    def dependent_metrics(self, model_id, hierarchy_id, property_ids=None):
+        if not property_ids:
+            return self.metrics_by_hierarchy.get((model_id, hierarchy_id), [])
+        metrics = {}
+        for property_id in property_ids:
+            for metric in self.hierarchy_dependents.get((model_id, hierarchy_id, property_id), []):
+                metrics[metric.property_id] = metric
+        return sorted(metrics.values(), key=lambda metric: metric.order)
+
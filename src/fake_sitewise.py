@@ -0,0 +1,209 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# Offline stand-in for the AWS IoT SiteWise client, used to benchmark the utilities without an AWS account.
+# The client serves a synthetic account and supports pagination, injected latency and throttling.
+
+import copy
+import datetime
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from botocore.exceptions import ClientError
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 250
+MEASUREMENTS_PER_MODEL = 3
+HIERARCHIES_PER_MODEL = 2
+
+# Synthetic account holding asset models, assets and their hierarchies
+class SyntheticAccount:
+    def __init__(self):
+        self.models = {}
+        self.assets = {}
+        self.assets_by_model = {}
+        self.child_assets = {}
+        self.parent_assets = {}
+        self.root_asset_ids = []
+
+    def add_model(self, random_generator, name):
+        model_id = str(uuid.UUID(int=random_generator.getrandbits(128)))
+        timestamp = datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc)
+        self.models[model_id] = {'assetModelId': model_id,
+                                 'assetModelArn': f'arn:aws:iotsitewise:us-east-1:123456789012:asset-model/{model_id}',
+                                 'assetModelName': name,
+                                 'assetModelDescription': '',
+                                 'assetModelProperties': [],
+                                 'assetModelHierarchies': [],
+                                 'assetModelCompositeModels': [],
+                                 'assetModelCreationDate': timestamp,
+                                 'assetModelLastUpdateDate': timestamp,
+                                 'assetModelStatus': {'state': 'ACTIVE'}}
+        self.assets_by_model[model_id] = []
+        return model_id
+
+    def add_asset(self, random_generator, name, model_id, parent_asset_id=None, hierarchy_id=None):
+        asset_id = str(uuid.UUID(int=random_generator.getrandbits(128)))
+        hierarchies = [{'id': hierarchy['id'], 'name': hierarchy['name']} for hierarchy in self.models[model_id]['assetModelHierarchies']]
+        self.assets[asset_id] = {'id': asset_id, 'name': name, 'assetModelId': model_id, 'hierarchies': hierarchies}
+        self.assets_by_model[model_id].append(asset_id)
+        if parent_asset_id:
+            self.child_assets.setdefault((parent_asset_id, hierarchy_id), []).append(asset_id)
+            self.parent_assets[asset_id] = (parent_asset_id, hierarchy_id)
+        else:
+            self.root_asset_ids.append(asset_id)
+        return asset_id
+
+# Generate a synthetic account.
+# Models are spread over hierarchy_depth levels, each model above the lowest level defines hierarchies to models of the next level,
+# with metric_density metrics per hierarchy rolling up a property of the child model. Each asset has fan_out child assets per hierarchy.
+def generate_account(model_count=100, hierarchy_depth=4, fan_out=3, metric_density=2, seed=1):
+    random_generator = random.Random(seed)
+    account = SyntheticAccount()
+    levels = [[] for _ in range(hierarchy_depth)]
+    for index in range(model_count):
+        level = index % hierarchy_depth
+        model_id = account.add_model(random_generator, f'Model L{level+1}-{index // hierarchy_depth + 1}')
+        levels[level].append(model_id)
+        for measurement in range(MEASUREMENTS_PER_MODEL):
+            account.models[model_id]['assetModelProperties'].append({'id': str(uuid.UUID(int=random_generator.getrandbits(128))),
+                                                                     'name': f'Measurement {measurement+1}', 'dataType': 'DOUBLE',
+                                                                     'type': {'measurement': {}}})
+
+    # Hierarchies and roll-up metrics, from the lowest level up so that child metrics can be rolled up again
+    for level in reversed(range(hierarchy_depth - 1)):
+        if not levels[level+1]: continue
+        for model_id in levels[level]:
+            model = account.models[model_id]
+            for hierarchy_index in range(HIERARCHIES_PER_MODEL):
+                child_model_id = random_generator.choice(levels[level+1])
+                hierarchy_id = str(uuid.UUID(int=random_generator.getrandbits(128)))
+                model['assetModelHierarchies'].append({'id': hierarchy_id, 'name': f'Hierarchy {hierarchy_index+1}', 'childAssetModelId': child_model_id})
+                child_properties = account.models[child_model_id]['assetModelProperties']
+                for metric in range(metric_density):
+                    child_property = random_generator.choice(child_properties)
+                    model['assetModelProperties'].append({'id': str(uuid.UUID(int=random_generator.getrandbits(128))),
+                                                          'name': f'Metric {hierarchy_index+1}-{metric+1}', 'dataType': 'DOUBLE',
+                                                          'type': {'metric': {'expression': 'avg(x)',
+                                                                              'variables': [{'name': 'x', 'value': {'propertyId': child_property['id'], 'hierarchyId': hierarchy_id}}],
+                                                                              'window': {'tumbling': {'interval': '1h'}}}}})
+
+    # Asset trees, one root asset for every other model of the top level
+    for index, model_id in enumerate(levels[0][::2]):
+        worklist = [account.add_asset(random_generator, f'Asset {index+1}', model_id)]
+        while worklist:
+            asset_id = worklist.pop()
+            asset = account.assets[asset_id]
+            for hierarchy in account.models[asset['assetModelId']]['assetModelHierarchies']:
+                for child in range(fan_out):
+                    worklist.append(account.add_asset(random_generator, f'{asset["name"]}.{child+1}', hierarchy['childAssetModelId'], asset_id, hierarchy['id']))
+    return account
+
+# Generate a synthetic account whose model hierarchy is a chain of diamonds.
+# Each model above the lowest one defines two hierarchies to the model below, a metric per hierarchy rolling up the total of the
+# child model, and a total rolling up both, so that the parent models are reached through several paths with the same properties.
+def generate_diamond_account(depth=6, seed=1):
+    random_generator = random.Random(seed)
+    account = SyntheticAccount()
+    child_model_id = None
+    for level in range(depth):
+        model_id = account.add_model(random_generator, f'Diamond L{depth-level}')
+        properties = account.models[model_id]['assetModelProperties']
+        total_variables = []
+        if child_model_id is None:
+            total_id = str(uuid.UUID(int=random_generator.getrandbits(128)))
+            properties.append({'id': total_id, 'name': 'Total', 'dataType': 'DOUBLE', 'type': {'measurement': {}}})
+        for hierarchy_index in range(2 if child_model_id else 0):
+            hierarchy_id = str(uuid.UUID(int=random_generator.getrandbits(128)))
+            account.models[model_id]['assetModelHierarchies'].append({'id': hierarchy_id, 'name': f'Hierarchy {hierarchy_index+1}', 'childAssetModelId': child_model_id})
+            variable = {'name': f'x{hierarchy_index+1}', 'value': {'propertyId': child_total_id, 'hierarchyId': hierarchy_id}}
+            total_variables.append(variable)
+            properties.append({'id': str(uuid.UUID(int=random_generator.getrandbits(128))), 'name': f'Metric {hierarchy_index+1}', 'dataType': 'DOUBLE',
+                               'type': {'metric': {'expression': f'avg(x{hierarchy_index+1})', 'variables': [variable], 'window': {'tumbling': {'interval': '1h'}}}}})
+        if total_variables:
+            total_id = str(uuid.UUID(int=random_generator.getrandbits(128)))
+            properties.append({'id': total_id, 'name': 'Total', 'dataType': 'DOUBLE',
+                               'type': {'metric': {'expression': 'sum(x1) + sum(x2)', 'variables': total_variables, 'window': {'tumbling': {'interval': '1h'}}}}})
+        account.add_asset(random_generator, f'Asset {level+1}', model_id)
+        child_model_id, child_total_id = model_id, total_id
+    return account
+
+# Fake SiteWise client serving a synthetic account
+class FakeSiteWiseClient:
+    def __init__(self, account, latency=0.0, throttle_rate=0.0, seed=1):
+        self.account = account
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.random_generator = random.Random(seed)
+        self.calls = Counter()
+        self.throttles = Counter()
+        self.lock = threading.Lock()
+
+    # Count the call, then wait for the injected latency and throttle a share of the calls
+    def request(self, operation):
+        with self.lock:
+            self.calls[operation] += 1
+            throttled = self.random_generator.random() < self.throttle_rate
+            if throttled: self.throttles[operation] += 1
+        if self.latency: time.sleep(self.latency)
+        if throttled:
+            raise ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}, operation)
+
+    # Raise the error of the service for a resource that does not exist
+    def check_exists(self, resources, resource_id, operation):
+        if resource_id not in resources:
+            raise ClientError({'Error': {'Code': 'ResourceNotFoundException', 'Message': f'Resource {resource_id} not found'},
+                               'ResponseMetadata': {'HTTPStatusCode': 404}}, operation)
+
+    # Return one page of items
+    def page(self, items, result_key, maxResults=DEFAULT_PAGE_SIZE, nextToken=None):
+        start = int(nextToken) if nextToken else 0
+        end = start + min(maxResults, MAX_PAGE_SIZE)
+        response = {result_key: items[start:end]}
+        if end < len(items): response['nextToken'] = str(end)
+        return response
+
+    def asset_summary(self, asset_id):
+        return dict(self.account.assets[asset_id])
+
+    def list_asset_models(self, **kwargs):
+        self.request('list_asset_models')
+        summaries = [{'id': model['assetModelId'], 'arn': model['assetModelArn'], 'name': model['assetModelName'],
+                      'description': model['assetModelDescription'], 'creationDate': model['assetModelCreationDate'],
+                      'lastUpdateDate': model['assetModelLastUpdateDate'], 'status': model['assetModelStatus']}
+                     for model in self.account.models.values()]
+        return self.page(summaries, 'assetModelSummaries', **kwargs)
+
+    def describe_asset_model(self, assetModelId, excludeProperties=False):
+        self.request('describe_asset_model')
+        self.check_exists(self.account.models, assetModelId, 'DescribeAssetModel')
+        # Like boto3, each response is a new object, so that memory measurements include the responses kept by the utilities
+        model = copy.deepcopy(self.account.models[assetModelId])
+        if excludeProperties: model['assetModelProperties'] = []
+        return model
+
+    def list_assets(self, assetModelId=None, filter='ALL', **kwargs):
+        self.request('list_assets')
+        if assetModelId: self.check_exists(self.account.models, assetModelId, 'ListAssets')
+        asset_ids = self.account.assets_by_model[assetModelId] if assetModelId else self.account.root_asset_ids
+        if filter == 'TOP_LEVEL':
+            asset_ids = [asset_id for asset_id in asset_ids if asset_id not in self.account.parent_assets]
+        return self.page([self.asset_summary(asset_id) for asset_id in asset_ids], 'assetSummaries', **kwargs)
+
+    def describe_asset(self, assetId, excludeProperties=False):
+        self.request('describe_asset')
+        self.check_exists(self.account.assets, assetId, 'DescribeAsset')
+        asset = self.account.assets[assetId]
+        return {'assetId': asset['id'], 'assetName': asset['name'], 'assetModelId': asset['assetModelId'],
+                'assetHierarchies': asset['hierarchies'], 'assetProperties': []}
+
+    def list_associated_assets(self, assetId, hierarchyId=None, traversalDirection='CHILD', **kwargs):
+        self.request('list_associated_assets')
+        self.check_exists(self.account.assets, assetId, 'ListAssociatedAssets')
+        if traversalDirection == 'PARENT':
+            asset_ids = [self.account.parent_assets[assetId][0]] if assetId in self.account.parent_assets else []
+        else:
+            asset_ids = self.account.child_assets.get((assetId, hierarchyId), [])
+        return self.page([self.asset_summary(asset_id) for asset_id in asset_ids], 'assetSummaries', **kwargs)
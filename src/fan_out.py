@@ -0,0 +1,38 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import contextlib
+import io
+import boto3
+from concurrent.futures import ProcessPoolExecutor
+
+# Resolve the region and account ID of each region and profile pair to scan, as (region, profile, account ID) targets.
+# None stands for the default region or profile of the AWS configuration, pairs reaching the same account and region are scanned once.
+def resolve_targets(regions, profiles):
+    targets = {}
+    for profile in profiles or [None]:
+        for region in regions or [None]:
+            session = boto3.Session(region_name=region, profile_name=profile)
+            if not session.region_name:
+                raise Exception(f"\nNo region configured for profile {profile or 'default'}, provide it with --regions!")
+            account_id = session.client('sts').get_caller_identity()['Account']
+            targets.setdefault((account_id, session.region_name), (session.region_name, profile, account_id))
+    return list(targets.values())
+
+# Run a function with its progress output suppressed
+def run_quietly(function, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args)
+
+# Run function(region, profile, account ID, *args) for each target in a separate process, with its own client and rate limits.
+# Targets are scanned in parallel, the (target, result) pairs are generated in the order of the targets.
+def run_targets(function, targets, *args):
+    with ProcessPoolExecutor(max_workers=len(targets)) as executor:
+        futures = [executor.submit(run_quietly, function, *target, *args) for target in targets]
+        for target, future in zip(targets, futures):
+            try:
+                result = future.result()
+            except Exception as error:
+                for pending_future in futures: pending_future.cancel()
+                raise Exception(f"\nScan of region {target[0]} with profile {target[1] or 'default'} failed: {error}")
+            yield target, result
@@ -0,0 +1,309 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from botocore.exceptions import ClientError
+from request_pacing import MAX_PAGE_SIZE
+
+DEFAULT_CONCURRENCY = 10
+
+# Asset in the hierarchy tree built by the traversal
+class AssetNode:
+    def __init__(self, asset_id, name=None, model_id=None, hierarchy_id=None, depth=1, hierarchies=None):
+        self.asset_id = asset_id
+        self.name = name
+        self.model_id = model_id
+        self.hierarchy_id = hierarchy_id
+        self.depth = depth
+        self.hierarchies = hierarchies
+        self.children = []
+
+# Create a node for an asset summary returned by ListAssociatedAssets
+def node_from_summary(asset_summary, hierarchy_id, depth):
+    return AssetNode(asset_summary['id'], asset_summary['name'], asset_summary['assetModelId'], hierarchy_id, depth,
+                     asset_summary.get('hierarchies'))
+
+# Serialize a tree of nodes to a checkpoint
+def node_to_dict(node):
+    return {'assetId': node.asset_id, 'name': node.name, 'modelId': node.model_id, 'hierarchyId': node.hierarchy_id,
+            'depth': node.depth, 'hierarchies': node.hierarchies, 'children': [node_to_dict(child) for child in node.children]}
+
+# Rebuild a tree of nodes from a checkpoint
+def node_from_dict(node_dict):
+    node = AssetNode(node_dict['assetId'], node_dict['name'], node_dict['modelId'], node_dict['hierarchyId'], node_dict['depth'],
+                     node_dict['hierarchies'])
+    node.children = [node_from_dict(child) for child in node_dict['children']]
+    return node
+
+# Nodes of a tree at the given depth
+def nodes_at_depth(root, depth):
+    level = [root]
+    while level and level[0].depth < depth:
+        level = [child for node in level for child in node.children]
+    return level
+
+# Breadth-first traversal of an asset hierarchy.
+# All nodes on a level are expanded concurrently, API calls are paced by the client.
+# With a checkpointer, the time budget is checked as nodes are expanded and the partial tree is saved to resume the traversal.
+class HierarchyTraversal:
+    def __init__(self, client, concurrency=DEFAULT_CONCURRENCY, max_depth=None, checkpointer=None):
+        self.client = client
+        self.concurrency = concurrency
+        self.max_depth = max_depth
+        self.checkpointer = checkpointer
+
+    # Run a blocking API call in the worker pool, limited to the configured concurrency
+    async def call(self, function, *args):
+        async with self.semaphore:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    # Retrieve all associated assets for a given asset and hierarchy
+    def list_associated_assets(self, asset_id, hierarchy_id):
+        return self.client.paginate('list_associated_assets', 'assetSummaries', assetId=asset_id, hierarchyId=hierarchy_id)
+
+    # Describe an asset without its properties
+    def describe_asset(self, asset_id):
+        return self.client.describe_asset(assetId=asset_id, excludeProperties=True)
+
+    # Retrieve the child assets of a node, hierarchies come from the asset summary when available
+    async def expand(self, node):
+        if node.hierarchies is None:
+            response = await self.call(self.describe_asset, node.asset_id)
+            node.name = response['assetName']
+            node.model_id = response['assetModelId']
+            node.hierarchies = response['assetHierarchies']
+        hierarchy_ids = [hierarchy['id'] for hierarchy in node.hierarchies]
+        results = await asyncio.gather(*(self.call(self.list_associated_assets, node.asset_id, hierarchy_id)
+                                         for hierarchy_id in hierarchy_ids))
+        for hierarchy_id, associated_assets in zip(hierarchy_ids, results):
+            node.children += [node_from_summary(asset, hierarchy_id, node.depth+1) for asset in associated_assets]
+        node.hierarchies = []
+
+    # Traversal state saved to the checkpoint, nodes of the current level that are already expanded have no hierarchies left
+    def checkpoint_state(self, root, depth):
+        return {'assetId': root.asset_id, 'maxDepth': self.max_depth, 'depth': depth, 'tree': node_to_dict(root)}
+
+    # Expand the nodes of a level, with as many nodes in flight as concurrent API calls so that every call slot stays busy.
+    # The time budget is checked as each node completes, no node is started once it is exhausted.
+    # Nodes in flight are cancelled when the traversal stops, they are still pending in the checkpoint.
+    async def expand_level(self, pending_nodes, state_function):
+        pending_nodes = iter(pending_nodes)
+        tasks = set()
+        try:
+            while True:
+                for node in pending_nodes:
+                    tasks.add(asyncio.ensure_future(self.expand(node)))
+                    if len(tasks) >= self.concurrency: break
+                if not tasks: return
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done: task.result()
+                if self.checkpointer: self.checkpointer.check(state_function)
+        finally:
+            for task in tasks: task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    # Build the hierarchy tree under the given asset, level by level.
+    # A traversal resumed from a checkpoint state continues with the nodes of its current level that are not expanded yet.
+    async def traverse(self, asset_id, state=None):
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        root = node_from_dict(state['tree']) if state else AssetNode(asset_id)
+        depth = state['depth'] if state else 1
+        with ThreadPoolExecutor(max_workers=self.concurrency) as self.executor:
+            level = nodes_at_depth(root, depth)
+            while level and (self.max_depth is None or depth <= self.max_depth):
+                pending_nodes = [node for node in level if node.hierarchies is None or len(node.hierarchies) > 0]
+                await self.expand_level(pending_nodes, lambda: self.checkpoint_state(root, depth))
+                level = [child for node in level for child in node.children]
+                depth += 1
+        return root
+
+    def run(self, asset_id, state=None):
+        return asyncio.run(self.traverse(asset_id, state))
+
+# Stack frame of the depth-first edge traversal, holding the current page of child assets of an asset
+def new_edges_frame(asset_id, depth, hierarchies):
+    return {'assetId': asset_id, 'depth': depth, 'hierarchyIds': [hierarchy['id'] for hierarchy in hierarchies],
+            'hierarchyIndex': -1, 'nextToken': None, 'page': [], 'pageIndex': 0}
+
+# Load the next page of child assets of a frame, returns False once all hierarchies of the asset are exhausted
+def load_next_page(client, frame):
+    kwargs = {'assetId': frame['assetId'], 'maxResults': MAX_PAGE_SIZE}
+    if frame['nextToken']:
+        kwargs['nextToken'] = frame['nextToken']
+    elif frame['hierarchyIndex'] + 1 < len(frame['hierarchyIds']):
+        frame['hierarchyIndex'] += 1
+    else:
+        return False
+    kwargs['hierarchyId'] = frame['hierarchyIds'][frame['hierarchyIndex']]
+    response = client.call('list_associated_assets', **kwargs)
+    frame['page'] = response['assetSummaries']
+    frame['pageIndex'] = 0
+    frame['nextToken'] = response.get('nextToken')
+    return True
+
+# Generate parent-child edges of the hierarchy under the given asset, depth-first and in sibling order.
+# Only the current page of each level is held in memory, whatever the size of the tree.
+# The traversal state is kept in state['stack'], as it is after each generated edge, so that it can be saved and resumed.
+def iter_hierarchy_edges(client, asset_id, max_depth=None, state=None):
+    if state is None: state = {}
+    if state.get('stack') is None:
+        response = client.describe_asset(assetId=asset_id, excludeProperties=True)
+        state['stack'] = [new_edges_frame(asset_id, 1, response['assetHierarchies'])]
+    stack = state['stack']
+    while stack:
+        frame = stack[-1]
+        if frame['pageIndex'] >= len(frame['page']):
+            if not load_next_page(client, frame): stack.pop()
+            continue
+        asset_summary = frame['page'][frame['pageIndex']]
+        frame['pageIndex'] += 1
+        depth = frame['depth']
+        if max_depth is None or depth < max_depth:
+            stack.append(new_edges_frame(asset_summary['id'], depth+1, asset_summary['hierarchies']))
+        yield {'parentAssetId': frame['assetId'], 'assetId': asset_summary['id'], 'assetName': asset_summary['name'],
+               'assetModelId': asset_summary['assetModelId'], 'hierarchyId': frame['hierarchyIds'][frame['hierarchyIndex']], 'depth': depth+1}
+
+# Crawl of all asset hierarchies of the account.
+# Root assets of each model are listed with the TOP_LEVEL filter, and all trees are expanded through a shared work queue.
+# Each task lists one page of root assets of a model or of child assets of an asset hierarchy, up to `concurrency` tasks run at a time,
+# alternating between root and child tasks so that the quotas of both operations are used. Results are consumed in submission order,
+# so that the output is deterministic. Asset summaries hold the hierarchies of the assets, so no asset needs to be described.
+class ForestCrawl:
+    def __init__(self, client, concurrency=DEFAULT_CONCURRENCY, max_depth=None):
+        self.client = client
+        self.concurrency = concurrency
+        self.max_depth = max_depth
+
+    # List one page of assets for a task
+    def run_task(self, task):
+        kwargs = {'maxResults': MAX_PAGE_SIZE}
+        if task['nextToken']: kwargs['nextToken'] = task['nextToken']
+        if task['type'] == 'roots':
+            return self.client.call('list_assets', assetModelId=task['modelId'], filter='TOP_LEVEL', **kwargs)
+        return self.client.call('list_associated_assets', assetId=task['assetId'], hierarchyId=task['hierarchyId'], **kwargs)
+
+    # Edges of a page of assets, the tasks listing their child assets are queued
+    def page_edges(self, task, response, child_tasks):
+        depth = 1 if task['type'] == 'roots' else task['depth'] + 1
+        edges = []
+        for asset_summary in response['assetSummaries']:
+            edges.append({'parentAssetId': task.get('assetId', ''), 'assetId': asset_summary['id'], 'assetName': asset_summary['name'],
+                          'assetModelId': asset_summary['assetModelId'], 'hierarchyId': task.get('hierarchyId', ''), 'depth': depth})
+            if self.max_depth is None or depth <= self.max_depth:
+                for hierarchy in asset_summary['hierarchies']:
+                    child_tasks.append({'type': 'children', 'assetId': asset_summary['id'], 'hierarchyId': hierarchy['id'], 'depth': depth, 'nextToken': None})
+        return edges
+
+    # Generate the edges of all asset hierarchies of the given models, root assets have no parent asset and no hierarchy.
+    # The crawl state, including the counts of assets per model and per depth, is kept in the given state dictionary
+    # as it is after each generated edge, so that it can be saved and resumed.
+    def iter_edges(self, model_ids, state):
+        if 'rootTasks' not in state:
+            state.update({'rootTasks': [{'type': 'roots', 'modelId': model_id, 'nextToken': None} for model_id in model_ids],
+                          'childTasks': [], 'inFlightTasks': [], 'page': [], 'pageIndex': 0, 'assetCounts': {}, 'depthCounts': []})
+        # Root and child tasks alternate from the saved turn, so that a resumed crawl generates the edges in the same order
+        state.setdefault('takeRootTask', True)
+        root_tasks = state['rootTasks'] = deque(state['rootTasks'])
+        child_tasks = state['childTasks'] = deque(state['childTasks'])
+        in_flight_tasks = state['inFlightTasks'] = deque(state['inFlightTasks'])
+        asset_counts = state['assetCounts']
+        depth_counts = state['depthCounts']
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = deque(executor.submit(self.run_task, task) for task in in_flight_tasks)
+            while True:
+                while state['pageIndex'] < len(state['page']):
+                    edge = state['page'][state['pageIndex']]
+                    state['pageIndex'] += 1
+                    asset_counts[edge['assetModelId']] = asset_counts.get(edge['assetModelId'], 0) + 1
+                    if len(depth_counts) < edge['depth']: depth_counts.append(0)
+                    depth_counts[edge['depth']-1] += 1
+                    yield edge
+                # Keep the work queue full
+                while len(futures) < self.concurrency and (root_tasks or child_tasks):
+                    tasks = root_tasks if root_tasks and (state['takeRootTask'] or not child_tasks) else child_tasks
+                    state['takeRootTask'] = not state['takeRootTask']
+                    task = tasks.popleft()
+                    in_flight_tasks.append(task)
+                    futures.append(executor.submit(self.run_task, task))
+                if not futures: break
+                response = futures.popleft().result()
+                task = in_flight_tasks.popleft()
+                if response.get('nextToken'):
+                    (root_tasks if task['type'] == 'roots' else child_tasks).append(dict(task, nextToken=response['nextToken']))
+                state['page'] = self.page_edges(task, response, child_tasks)
+                state['pageIndex'] = 0
+
+# Resolution of the ancestor paths of many assets, walking up the hierarchy from each asset.
+# Parents and names are memoized and shared by all assets, so that assets with common ancestors reuse the same lookups,
+# and each lookup is made once even when several assets need it at the same time.
+class AncestorResolver:
+    def __init__(self, client, concurrency=DEFAULT_CONCURRENCY):
+        self.client = client
+        self.concurrency = concurrency
+        self.parents = {}
+        self.names = {}
+        self.lock = threading.Lock()
+
+    # Return the result of a lookup, made by the first caller and awaited by the others
+    def memoized(self, cache, asset_id, function):
+        with self.lock:
+            future = cache.get(asset_id)
+            owner = future is None
+            if owner:
+                future = Future()
+                cache[asset_id] = future
+        if owner:
+            try:
+                future.set_result(function(asset_id))
+            except Exception as error:
+                future.set_exception(error)
+        return future.result()
+
+    # Look up the parent asset of an asset, the name of the parent comes with it
+    def lookup_parent(self, asset_id):
+        response = self.client.call('list_associated_assets', assetId=asset_id, traversalDirection='PARENT')
+        if not response['assetSummaries']: return None
+        parent_summary = response['assetSummaries'][0]
+        self.memoized(self.names, parent_summary['id'], lambda parent_id: parent_summary['name'])
+        return parent_summary['id']
+
+    # Look up the name of an asset that is not an ancestor of another asset
+    def lookup_name(self, asset_id):
+        return self.client.describe_asset(assetId=asset_id, excludeProperties=True)['assetName']
+
+    def parent(self, asset_id):
+        return self.memoized(self.parents, asset_id, self.lookup_parent)
+
+    def name(self, asset_id):
+        return self.memoized(self.names, asset_id, self.lookup_name)
+
+    # IDs of the assets from the root asset to the given asset
+    def path_ids(self, asset_id):
+        path = [asset_id]
+        while True:
+            parent_id = self.parent(path[-1])
+            if parent_id is None: break
+            path.append(parent_id)
+        return path[::-1]
+
+    # IDs of the assets from the root asset to the given asset, None when the asset does not exist (anymore)
+    def existing_path_ids(self, asset_id):
+        try:
+            return self.path_ids(asset_id)
+        except ClientError as error:
+            if error.response.get('Error', {}).get('Code') != 'ResourceNotFoundException': raise
+            return None
+
+    # Resolve the paths of the given assets, returns (asset ID, asset name, path IDs, path names) tuples in input order.
+    # The name and paths of assets that do not exist are None.
+    # All ancestors are resolved first, so that only the assets that are not an ancestor of another asset are described.
+    def resolve(self, asset_ids):
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            paths = list(executor.map(self.existing_path_ids, asset_ids))
+            found_asset_ids = [asset_id for asset_id, path in zip(asset_ids, paths) if path is not None]
+            names = dict(zip(found_asset_ids, executor.map(self.name, found_asset_ids)))
+        return [(asset_id, names[asset_id], path, [self.name(path_id) for path_id in path]) if path is not None else (asset_id, None, None, None)
+                for asset_id, path in zip(asset_ids, paths)]
@@ -0,0 +1,109 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import atexit
+import json
+import threading
+import time
+from array import array
+
+# Statistics of an API operation
+class OperationMetrics:
+    def __init__(self):
+        self.calls = 0
+        self.retries = 0
+        self.throttles = 0
+        self.errors = 0
+        self.bytes = 0
+        self.latencies = array('d')
+        self.pacing_seconds = 0.0
+        self.backoff_seconds = 0.0
+
+# Return the given percentile of sorted values (nearest rank)
+def percentile(sorted_values, percent):
+    if not sorted_values: return 0.0
+    index = max(0, int(round(percent / 100 * len(sorted_values))) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+# Size of an API response body, from the HTTP headers returned by boto3
+def response_size(response):
+    headers = response.get('ResponseMetadata', {}).get('HTTPHeaders', {})
+    return int(headers.get('content-length', 0))
+
+# Thread-safe per-operation metrics of the API calls made through a client
+class ClientMetrics:
+    def __init__(self):
+        self.operations = {}
+        self.lock = threading.Lock()
+
+    def operation(self, operation):
+        if operation not in self.operations: self.operations[operation] = OperationMetrics()
+        return self.operations[operation]
+
+    # Record a completed request (successful or not) and the time spent waiting on the network
+    def record_call(self, operation, latency, size=0, error=False):
+        with self.lock:
+            metrics = self.operation(operation)
+            metrics.calls += 1
+            metrics.bytes += size
+            metrics.latencies.append(latency)
+            if error: metrics.errors += 1
+
+    # Record a throttled request that is retried after the given backoff
+    def record_throttle(self, operation, backoff_seconds, retried=True):
+        with self.lock:
+            metrics = self.operation(operation)
+            metrics.throttles += 1
+            if retried: metrics.retries += 1
+            metrics.backoff_seconds += backoff_seconds
+
+    # Record a request that failed on a transient error and is retried after the given backoff
+    def record_retry(self, operation, backoff_seconds):
+        with self.lock:
+            metrics = self.operation(operation)
+            metrics.retries += 1
+            metrics.backoff_seconds += backoff_seconds
+
+    # Record the time spent waiting for the rate limiter
+    def record_pacing(self, operation, seconds):
+        with self.lock:
+            self.operation(operation).pacing_seconds += seconds
+
+    # Build the run report: calls, latency percentiles, retries, throttles, bytes and sleep versus network time
+    def report(self, wall_time=None):
+        operations = {}
+        totals = {'calls': 0, 'retries': 0, 'throttles': 0, 'errors': 0, 'bytes': 0,
+                  'networkSeconds': 0.0, 'pacingSleepSeconds': 0.0, 'backoffSleepSeconds': 0.0}
+        with self.lock:
+            for operation, metrics in sorted(self.operations.items()):
+                latencies = sorted(metrics.latencies)
+                operations[operation] = {'calls': metrics.calls,
+                                         'retries': metrics.retries,
+                                         'throttles': metrics.throttles,
+                                         'errors': metrics.errors,
+                                         'bytes': metrics.bytes,
+                                         'latencySeconds': {'p50': round(percentile(latencies, 50), 4),
+                                                            'p95': round(percentile(latencies, 95), 4),
+                                                            'p99': round(percentile(latencies, 99), 4),
+                                                            'max': round(latencies[-1], 4) if latencies else 0.0},
+                                         'networkSeconds': round(sum(latencies), 3),
+                                         'pacingSleepSeconds': round(metrics.pacing_seconds, 3),
+                                         'backoffSleepSeconds': round(metrics.backoff_seconds, 3)}
+                for key in ['calls', 'retries', 'throttles', 'errors', 'bytes', 'networkSeconds', 'pacingSleepSeconds', 'backoffSleepSeconds']:
+                    totals[key] += operations[operation][key]
+        totals = {key: round(value, 3) for key, value in totals.items()}
+        return {'wallTimeSeconds': round(wall_time, 3) if wall_time is not None else None,
+                'totals': totals,
+                'operations': operations}
+
+    # Write the run report to a JSON file
+    def write_report(self, file_path, wall_time=None):
+        with open(file_path, mode='w') as json_file:
+            json.dump(self.report(wall_time), json_file, indent=2)
+
+# Write the run report of the client when the script exits, including when it stops on an error
+def report_on_exit(client, file_path, start_time):
+    def write_run_report():
+        client.metrics.write_report(file_path, time.time() - start_time)
+        print(f'\nExported report to {file_path}')
+    atexit.register(write_run_report)
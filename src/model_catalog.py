@@ -0,0 +1,253 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import sys
+import threading
+from array import array
+from concurrent.futures import Future
+from model_snapshot import model_version
+
+# Summary of an asset model, holding only the fields used by the utilities
+class ModelSummary:
+    __slots__ = ('id', 'name', 'state', 'version')
+
+    def __init__(self, model_id, name, state, version):
+        self.id = model_id
+        self.name = name
+        self.state = state
+        self.version = version
+
+# Create a summary from a ListAssetModels summary, IDs are interned so that each ID is stored once
+def summary_from_response(model_summary):
+    return ModelSummary(sys.intern(model_summary['id']), model_summary['name'], model_summary['status']['state'], model_version(model_summary))
+
+# Hierarchy definition of an asset model
+class HierarchyRecord:
+    __slots__ = ('id', 'name', 'child_model_id')
+
+    def __init__(self, hierarchy_id, name, child_model_id):
+        self.id = hierarchy_id
+        self.name = name
+        self.child_model_id = child_model_id
+
+# Property of an asset model, variables are (property ID, hierarchy ID or None) pairs of metrics and transforms
+class PropertyRecord:
+    __slots__ = ('id', 'name', 'type_name', 'variables')
+
+    def __init__(self, property_id, name, type_name, variables):
+        self.id = property_id
+        self.name = name
+        self.type_name = type_name
+        self.variables = variables
+
+# Description of an asset model, properties is None when the model was described without its properties
+class ModelRecord:
+    __slots__ = ('id', 'name', 'hierarchies', 'properties', 'property_index', 'hierarchy_index')
+
+    def __init__(self, model_id, name, hierarchies, properties):
+        self.id = model_id
+        self.name = name
+        self.hierarchies = hierarchies
+        self.properties = properties
+        self.property_index = {item.id: item for item in properties} if properties else {}
+        self.hierarchy_index = {item.id: item for item in hierarchies}
+
+# Create a property record from a property of a DescribeAssetModel response
+def property_from_response(property):
+    property_type_obj = property['type']
+    property_type_name = list(property_type_obj.keys())[0]
+    variables = None
+    if 'variables' in property_type_obj[property_type_name]:
+        variables = tuple((sys.intern(variable['value']['propertyId']), sys.intern(variable['value']['hierarchyId']) if 'hierarchyId' in variable['value'] else None)
+                          for variable in property_type_obj[property_type_name]['variables'])
+    return PropertyRecord(sys.intern(property['id']), property['name'], sys.intern(property_type_name), variables)
+
+# Create a model record from a DescribeAssetModel response, the response itself is not kept
+def record_from_response(model, with_properties=True):
+    hierarchies = tuple(HierarchyRecord(sys.intern(item['id']), item['name'], sys.intern(item['childAssetModelId']))
+                        for item in model.get('assetModelHierarchies', []))
+    properties = tuple(property_from_response(item) for item in model.get('assetModelProperties', [])) if with_properties else None
+    return ModelRecord(sys.intern(model['assetModelId']), model['assetModelName'], hierarchies, properties)
+
+# DescribeAssetModel response holding the fields of a model record, from which the record can be created again
+def response_from_record(record):
+    properties = []
+    for item in record.properties or ():
+        property_type = {'variables': [{'value': {'propertyId': property_id, **({'hierarchyId': hierarchy_id} if hierarchy_id else {})}}
+                                       for property_id, hierarchy_id in item.variables]} if item.variables is not None else {}
+        properties.append({'id': item.id, 'name': item.name, 'type': {item.type_name: property_type}})
+    return {'assetModelId': record.id,
+            'assetModelName': record.name,
+            'assetModelHierarchies': [{'id': item.id, 'name': item.name, 'childAssetModelId': item.child_model_id} for item in record.hierarchies],
+            'assetModelProperties': properties}
+
+# Mapping between model IDs and integer indexes, used by the adjacency arrays of the catalog
+class IdTable:
+    __slots__ = ('ids', 'indexes')
+
+    def __init__(self):
+        self.ids = []
+        self.indexes = {}
+
+    def index(self, item_id):
+        index = self.indexes.get(item_id)
+        if index is None:
+            index = len(self.ids)
+            self.indexes[item_id] = index
+            self.ids.append(item_id)
+        return index
+
+# In-memory catalog of asset model descriptions.
+# Each model is described once per run, later lookups are served from memory and concurrent lookups wait for the description in flight.
+# Models are kept as compact records, and parent-child model edges as integer adjacency arrays.
+class ModelCatalog:
+    def __init__(self, client):
+        self.client = client
+        self.models = {}
+        self.models_without_properties = {}
+        self.describing = {}
+        self.describing_without_properties = {}
+        self.model_ids = IdTable()
+        self.parent_edges = {}
+        self.edges_added = set()
+        self.hits = 0
+        self.misses = 0
+        self.snapshot = None
+        self.model_summaries = {}
+        self.lock = threading.Lock()
+
+    # Add a DescribeAssetModel response to the catalog as a model record
+    def add(self, model):
+        record = record_from_response(model)
+        with self.lock:
+            self.models[record.id] = record
+        return record
+
+    # Full descriptions of the models described so far, as DescribeAssetModel responses that add() accepts
+    def responses(self):
+        with self.lock:
+            records = list(self.models.values())
+        return [response_from_record(record) for record in records]
+
+    # Load the models that did not change since the snapshot was taken.
+    # Models that changed are described again on first use and saved to the snapshot.
+    def use_snapshot(self, snapshot, model_summaries):
+        self.snapshot = snapshot
+        self.model_summaries = {model_summary.id: model_summary for model_summary in model_summaries}
+        stored_versions = snapshot.model_versions()
+        snapshot.delete_models([model_id for model_id in stored_versions if model_id not in self.model_summaries])
+        up_to_date_count = 0
+        for model_id, model_summary in self.model_summaries.items():
+            # Models being created, updated or propagated are always described again
+            if model_summary.state != 'ACTIVE': continue
+            if stored_versions.get(model_id) != model_summary.version: continue
+            self.add(snapshot.load_model(model_id))
+            up_to_date_count += 1
+        return up_to_date_count, len(self.model_summaries) - up_to_date_count
+
+    # Return the cached record of a model, or describe it in the first caller while concurrent callers wait for its description.
+    # A failed description is raised to the waiting callers and not kept, the next lookup describes the model again.
+    def lookup(self, model_id, cached_model, in_flight, describe):
+        with self.lock:
+            model = cached_model()
+            future = in_flight.get(model_id) if model is None else None
+            owner = model is None and future is None
+            if owner:
+                self.misses += 1
+                future = Future()
+                in_flight[model_id] = future
+            else:
+                self.hits += 1
+        if model is not None: return model
+        if not owner: return future.result()
+        try:
+            model = describe()
+            future.set_result(model)
+            return model
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        finally:
+            with self.lock:
+                del in_flight[model_id]
+
+    # Retrieve the full description (properties and hierarchies) of a model
+    def describe(self, model_id):
+        # Describe the model and save it to the snapshot
+        def describe_model():
+            response = self.client.describe_asset_model(assetModelId=model_id)
+            response.pop('ResponseMetadata', None)
+            if self.snapshot and model_id in self.model_summaries:
+                self.snapshot.save_model(self.model_summaries[model_id].version, response)
+            return self.add(response)
+
+        return self.lookup(model_id, lambda: self.models.get(model_id), self.describing, describe_model)
+
+    # Retrieve the description of a model without its properties, cheaper than the full description.
+    # The full description is used when already known, or when it has to be saved to the snapshot.
+    def describe_without_properties(self, model_id):
+        if self.snapshot: return self.describe(model_id)
+
+        # Describe the model without its properties
+        def describe_model():
+            response = self.client.describe_asset_model(assetModelId=model_id, excludeProperties=True)
+            model = record_from_response(response, with_properties=False)
+            with self.lock:
+                self.models_without_properties[model_id] = model
+            return model
+
+        return self.lookup(model_id, lambda: self.models.get(model_id) or self.models_without_properties.get(model_id),
+                           self.describing_without_properties, describe_model)
+
+    # Retrieve name of the asset model
+    def model_name(self, model_id):
+        return self.describe(model_id).name
+
+    # Retrieve properties of the asset model
+    def properties(self, model_id):
+        return self.describe(model_id).properties
+
+    # Retrieve hierarchy definitions of the asset model
+    def hierarchies(self, model_id):
+        return self.describe(model_id).hierarchies
+
+    # Get property name for a given model id and property id
+    def property_name(self, model_id, property_id):
+        if not model_id: return ''
+        item = self.describe(model_id).property_index.get(property_id)
+        return item.name if item else ''
+
+    # Get child model id for a given model id and hierarchy id
+    def child_model_id(self, model_id, hierarchy_id):
+        item = self.describe(model_id).hierarchy_index.get(hierarchy_id)
+        return item.child_model_id if item else ''
+
+    # Add the edges from the child models of a described model to the model.
+    # Parents are listed once per hierarchy, in the order the models are added.
+    def add_parent_edges(self, model):
+        with self.lock:
+            parent_index = self.model_ids.index(model.id)
+            if parent_index in self.edges_added: return
+            self.edges_added.add(parent_index)
+            for hierarchy in model.hierarchies:
+                child_index = self.model_ids.index(hierarchy.child_model_id)
+                if child_index not in self.parent_edges: self.parent_edges[child_index] = array('i')
+                self.parent_edges[child_index].append(parent_index)
+
+    # Models with a hierarchy to the given model, each parent is listed once
+    def parent_model_ids(self, child_model_id):
+        with self.lock:
+            child_index = self.model_ids.indexes.get(child_model_id)
+            parent_indexes = self.parent_edges.get(child_index, [])
+            return [self.model_ids.ids[parent_index] for parent_index in dict.fromkeys(parent_indexes)]
+
+    # Return True if another model has a hierarchy to the given model
+    def is_referenced(self, model_id):
+        with self.lock:
+            return self.model_ids.indexes.get(model_id) in self.parent_edges
+
+    # Summary of cache usage
+    def stats(self):
+        lookups = self.hits + self.misses
+        hit_ratio = round(self.hits / lookups * 100, 1) if lookups else 0.0
+        return f'{self.hits} hits, {self.misses} misses ({hit_ratio}% hit ratio)'
@@ -2,27 +2,48 @@
 # SPDX-License-Identifier: MIT-0
 
 # Usage:
-# python3 src/model_references.py --asset-model-id <value>
+# python3 src/model_references.py --asset-model-id <value> [<value> ...] [--workers <value>] [--snapshot] [--report] [--time-budget <value>] [--regions <value> [<value> ...]] [--profiles <value> [<value> ...]] [--estimate]
+# python3 src/model_references.py --resume <value> [--snapshot] [--report] [--time-budget <value>]
 #
 # Example:
 # python3 src/model_references.py --asset-model-id ec6d3e7c-9026-4c1c-ac66-e73ba7666c2e
+# python3 src/model_references.py --asset-model-id ec6d3e7c-9026-4c1c-ac66-e73ba7666c2e --snapshot
+# python3 src/model_references.py --asset-model-id ec6d3e7c-9026-4c1c-ac66-e73ba7666c2e --report
+# python3 src/model_references.py --asset-model-id ec6d3e7c-9026-4c1c-ac66-e73ba7666c2e 4b1ac7b2-0a9a-4b4c-9f1e-3e8d1b2c5a77 --workers 8
+# python3 src/model_references.py --resume "exported_data/CNC Machine_references_1693801432_checkpoint.json" --snapshot
+# python3 src/model_references.py --asset-model-id ec6d3e7c-9026-4c1c-ac66-e73ba7666c2e 4b1ac7b2-0a9a-4b4c-9f1e-3e8d1b2c5a77 --regions us-east-1 eu-west-1 --profiles dev prod
+# python3 src/model_references.py --asset-model-id ec6d3e7c-9026-4c1c-ac66-e73ba7666c2e --snapshot --estimate
 
-import boto3
 import time
 import argparse
 import uuid
 import csv
+import io
 import os
+from concurrent.futures import ThreadPoolExecutor
+from model_catalog import ModelCatalog, summary_from_response
+from model_snapshot import ModelSnapshot, snapshot_file_name
+from dependency_graph import DependencyGraph
+from request_pacing import create_client, MAX_PAGE_SIZE
+from pipeline import ordered_map, PREFETCH_SIZE
+from instrumentation import report_on_exit
+from checkpoint import Checkpointer, BudgetCheck, TimeBudgetExhausted, load_checkpoint
+from fan_out import resolve_targets, run_targets
+from cost_estimate import operation_calls, add_calls, estimate_workload, print_estimate
 
 src_dir = os.path.abspath(os.path.dirname(__file__))
 root_dir = os.path.abspath(os.path.dirname(src_dir))
 
-sw_client = boto3.client('iotsitewise')
+# Client, catalog and dependency graph of the searched account and region, created once the arguments are parsed, or by the process of each target
+sw_client = None
+model_catalog = None
+dependency_graph = None
 csv_file_name_suffix = f'references_{int(time.time())}.csv'
-SCRIPT_TIMEOUT_SECONDS = 60*5 # 5 minutes
+SCRIPT_TIMEOUT_SECONDS = 60*5 # 5 minutes, default time budget of a run
 DATA_EXPORT_FOLDER_NAME = 'exported_data'
-references = []
-parent_models_map = {}
+BATCH_CSV_HEADER_PREFIX = ['Source Model Name', 'Source Model ID']
+TARGET_CSV_HEADER_PREFIX = ['Region', 'Account ID']
+CSV_HEADER = ['Reference Level', 'Reference Type', 'Asset Name', 'Asset ID', 'Hierarchy Name', 'Hierarchy ID', 'Model Name', 'Model ID', 'Property Name', 'Property ID', 'Property Type', 'Property Dependent On']
 
 # Recommended actions
 RECOMMENDED_ACTIONS = {
@@ -41,203 +62,388 @@ def valid_uuid(value):
 
 # Retrieve name of the asset model
 def get_asset_model_name(model_id):
-    model_name = None
-    response = sw_client.describe_asset_model(assetModelId=model_id,excludeProperties=True)
-    model_name = response['assetModelName']
-    return model_name
+    return model_catalog.model_name(model_id)
 
-# Retrieve all models
+# Generate all models as compact summaries, the next pages are fetched while the models are described
+def iter_models():
+    for model_summary in sw_client.iterate('list_asset_models', 'assetModelSummaries', prefetch_pages=PREFETCH_SIZE):
+        yield summary_from_response(model_summary)
+
+# Retrieve all models as compact summaries
 def list_models():
-    all_models = []
-    next_token = None
-    # Paginate
-    while True:
-        if next_token:
-            response = sw_client.list_asset_models(nextToken=next_token)
-        else:
-            response = sw_client.list_asset_models()
-        asset_models = response['assetModelSummaries']
-        all_models += asset_models
-        # Check if there are more pages of results
-        if 'nextToken' in response:
-            next_token = response['nextToken']
-        else:
-            break   
-        time.sleep(1) 
-    return all_models
-
-# Retrieve assets created from a given model
-def list_assets(model_id):
-    all_assets = []
-    next_token = None
-    # Paginate
-    while True:
-        if next_token:
-            response = sw_client.list_assets(assetModelId=model_id, nextToken=next_token)
-        else:
-            response = sw_client.list_assets(assetModelId=model_id)
-        assets = response['assetSummaries']
-        all_assets += assets
-        # Check if there are more pages of results
-        if 'nextToken' in response:
-            next_token = response['nextToken']
-        else:
-            break   
-        time.sleep(1) 
-    return all_assets
-
-# Get property name for a given model id and property id
-def property_name_from_ids(model_id, property_id):
-    property_name = ''
-    response = sw_client.describe_asset_model(assetModelId=model_id)
-    asset_model_properties = response['assetModelProperties']
-    for item in asset_model_properties:
-        if item['id'] == property_id: property_name = item['name']
-    return property_name
-
-# Map parent models for each model in SiteWise
-def build_parent_models_map(models):
-    global parent_models_map
-    for model in models:
-        model_id = model['id']
-        response = sw_client.describe_asset_model(assetModelId=model_id, excludeProperties=True)
-        asset_model_hierarchies = response['assetModelHierarchies']
-
-        for hierarchy in asset_model_hierarchies:
-            child_model_id = hierarchy['childAssetModelId']
-            if child_model_id in parent_models_map:
-                parent_models_map[child_model_id].append(model_id)
-            else:
-                parent_models_map[child_model_id] = [model_id]
-        
-        time.sleep(1/100) # Limit to a maximum of 100 DescribeAssetModel API calls per second
+    return list(iter_models())
+
+# Retrieve one page of assets created from a given model
+def list_assets_page(model_id, next_token=None):
+    if next_token:
+        return sw_client.list_assets(assetModelId=model_id, maxResults=MAX_PAGE_SIZE, nextToken=next_token)
+    return sw_client.list_assets(assetModelId=model_id, maxResults=MAX_PAGE_SIZE)
+
+# Map parent models for each model in SiteWise and build the property dependency graph.
+# Models are described by the workers as they are listed, and added to the map in model order.
+# With a checkpointer, the state returned by state_function is saved periodically and when the time budget is exhausted.
+def build_parent_models_map(models, workers=1, checkpointer=None, state_function=None):
+    # Each run describes at least one model before it can stop
+    known_model_count = len(model_catalog.models)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for model in ordered_map(executor, lambda model: model_catalog.describe(model.id), models, 2 * workers):
+            model_catalog.add_parent_edges(model)
+            dependency_graph.add_model(model.id)
+            if checkpointer and len(model_catalog.models) > known_model_count: checkpointer.check(state_function)
 
 # Retrieve hierarchy references for the given model
 def get_hierarchy_references(child_model_id):
     hierarchy_references_formatted = []
 
-    if child_model_id in parent_models_map:
-        for parent_id in parent_models_map[child_model_id]:
-            response = sw_client.describe_asset_model(assetModelId=parent_id, excludeProperties=True)
-            hierarchy_references = response['assetModelHierarchies']
-            for model_hierarchy in hierarchy_references:  
-                if model_hierarchy['childAssetModelId'] == child_model_id:
-                    hierarchy_references_formatted.append({'assetModelId': parent_id,
-                                            'assetModelName': response['assetModelName'],
-                                            'hierarchyName': model_hierarchy['name'],
-                                            'hierarchyId': model_hierarchy['id']})
+    # A parent model with several hierarchies for the same child model is listed once per hierarchy
+    for parent_id in model_catalog.parent_model_ids(child_model_id):
+        hierarchy_references = model_catalog.hierarchies(parent_id)
+        for model_hierarchy in hierarchy_references:
+            if model_hierarchy.child_model_id == child_model_id:
+                hierarchy_references_formatted.append({'assetModelId': parent_id,
+                                        'assetModelName': model_catalog.model_name(parent_id),
+                                        'hierarchyName': model_hierarchy.name,
+                                        'hierarchyId': model_hierarchy.id})
     return hierarchy_references_formatted
 
 # Retrieve dependent properties
 def extract_dependent_properties(model_id, hierarchy_id, lower_level_properties):
-    properties = []
     lower_level_property_ids = [property['propertyId'] for property in lower_level_properties]
-    lower_level_property_names = [property['propertyName'] for property in lower_level_properties]
-    response = sw_client.describe_asset_model(assetModelId=model_id)
-    asset_model_properties = response['assetModelProperties']
-    asset_model_hierarchies = response['assetModelHierarchies']
-
-    for property in asset_model_properties:
-        property_type_obj = property['type']
-        property_name = property['name']
-        property_id = property['id']
-        property_type_name = list(property_type_obj.keys())[0]
-
-        if property_type_name == 'metric' and 'variables' in property_type_obj[property_type_name]: 
-            variables = property_type_obj[property_type_name]['variables']
-            include_property = False
-            dependent_on = ''
-            for variable in variables:
-                property_value_obj = variable['value']
-                independent_property_id = property_value_obj['propertyId']
-                # Property dependent on lower level properties
-                if 'hierarchyId' in property_value_obj:
-                    # Dependent on property part of dependency tree
-                    if independent_property_id in lower_level_property_ids:
-                        index = lower_level_property_ids.index(independent_property_id)
-                        dependent_on += lower_level_property_names[index] + ','
-                    # Dependent on property not part of dependency tree
-                    else:
-                        child_model_id = ''
-                        for item in asset_model_hierarchies:
-                            if item['id'] == property_value_obj['hierarchyId']: 
-                                child_model_id = item['childAssetModelId']
-                                break
-                        independent_property_name = property_name_from_ids(child_model_id, independent_property_id)
-                        dependent_on += independent_property_name + ','
-                # Property not dependent on lower level properties
-                else:
-                    independent_property_name = ''
-                    for item in asset_model_properties:
-                        if item['id'] == independent_property_id: independent_property_name = item['name']
-                    dependent_on += independent_property_name + ','
-
-                if ('hierarchyId' in property_value_obj and property_value_obj['hierarchyId'] == hierarchy_id and
-                        (independent_property_id in lower_level_property_ids or len(lower_level_properties) == 0)):
-                    include_property = True
-
-            if include_property:
-                properties.append({'propertyName': property_name, 'propertyType': property_type_name, 'propertyId': property_id,
-                                   'propertyDependentOn': dependent_on})
-    return properties
-
-# Retrieve references for the given model
-def get_references(models, model_id, reference_level, lower_level_properties):
-    elapsed_time = time.time() - script_start_time
-    if elapsed_time > SCRIPT_TIMEOUT_SECONDS:
-        raise Exception("\n Script execution timeout reached!")
-    global references
-
-    if reference_level == 1:
-        assets = list_assets(model_id)
-        for asset in assets:
-            references.append([reference_level, 'Asset', asset['name'], asset['id'], '', '', '', '', '', '', '', ''])   
-
-    hierarchy_references = get_hierarchy_references(model_id)
-    for hierarchy in hierarchy_references:
+    metrics = dependency_graph.dependent_metrics(model_id, hierarchy_id, lower_level_property_ids)
+    return [{'propertyName': metric.name, 'propertyType': metric.type_name, 'propertyId': metric.property_id,
+             'propertyDependentOn': metric.dependent_on} for metric in metrics]
+
+# Initial traversal state of get_references
+def new_references_state(model_id):
+    return {'assetModelId': model_id,
+            'referenceCount': 0,
+            'assetsNextToken': None,
+            'assetsDone': False,
+            'subtrees': [],
+            'worklist': [{'modelId': model_id, 'referenceLevel': 1, 'properties': [], 'index': 0}]}
+
+# Key of the subtree of parent models reached through a hierarchy with the given lower level properties
+def subtree_key(parent_model_id, hierarchy_id, property_ids):
+    return (parent_model_id, hierarchy_id, frozenset(property_ids))
+
+# Subtree key as a JSON list, for checkpoints
+def subtree_key_list(key):
+    parent_model_id, hierarchy_id, property_ids = key
+    return [parent_model_id, hierarchy_id, sorted(property_ids)]
+
+# Retrieve references for the given model and write them to the CSV file, returns the number of references.
+# Parent models are explored depth-first with a worklist. Each (model, hierarchy, properties) subtree is explored once, its rows
+# and the subtrees it leads to are recorded, and the subtree is written again from the record when another path reaches it.
+# The traversal state can be saved to a checkpoint and resumed. Progress messages are passed to log.
+def get_references(model_id, csv_file, checkpointer=None, state=None, log=print):
+    csv_writer = csv.writer(csv_file)
+    if state is None: state = new_references_state(model_id)
+    # Rows of each subtree, with levels relative to the level it is reached at, and the subtrees one level up
+    subtrees = {subtree_key(parent_model_id, hierarchy_id, property_ids): (rows, [subtree_key(*child) for child in children])
+                for parent_model_id, hierarchy_id, property_ids, rows, children in state['subtrees']}
+    hierarchy_references_map = {}
+
+    # State of the traversal and size of the CSV file written so far
+    def checkpoint_state():
+        csv_file.flush()
+        state['csvOffset'] = csv_file.tell()
+        state['subtrees'] = [subtree_key_list(key) + [rows, [subtree_key_list(child) for child in children]]
+                             for key, (rows, children) in subtrees.items()]
+        return state
+
+    # Write the rows of a subtree reached at the given level, followed by those of the subtrees it leads to
+    def write_subtree(key, reference_level):
+        rows, children = subtrees[key]
+        for row in rows:
+            csv_writer.writerow([reference_level + row[0]] + row[1:])
+        state['referenceCount'] += len(rows)
+        log(f'\tChecking references at model: {get_asset_model_name(key[0])}..')
+        for child in children: write_subtree(child, reference_level + 1)
+
+    # Assets created from the model, one page at a time
+    while not state['assetsDone']:
+        response = list_assets_page(model_id, state['assetsNextToken'])
+        for asset in response['assetSummaries']:
+            csv_writer.writerow([1, 'Asset', asset['name'], asset['id'], '', '', '', '', '', '', '', ''])
+            state['referenceCount'] += 1
+        state['assetsNextToken'] = response.get('nextToken')
+        state['assetsDone'] = 'nextToken' not in response
+        if checkpointer: checkpointer.check(checkpoint_state)
+
+    # Each run makes progress on at least one worklist item before it can stop
+    worklist = state['worklist']
+    step_count = 0
+    while worklist:
+        if checkpointer and step_count > 0: checkpointer.check(checkpoint_state)
+        step_count += 1
+        item = worklist[-1]
+        if item['modelId'] not in hierarchy_references_map:
+            hierarchy_references_map[item['modelId']] = get_hierarchy_references(item['modelId'])
+        hierarchy_references = hierarchy_references_map[item['modelId']]
+        if item['index'] >= len(hierarchy_references):
+            worklist.pop()
+            continue
+        hierarchy = hierarchy_references[item['index']]
+        item['index'] += 1
+        reference_level = item['referenceLevel']
+        lower_level_properties = item['properties']
         parent_model_id = hierarchy['assetModelId']
         parent_model_name = hierarchy['assetModelName']
         hierarchy_id = hierarchy['hierarchyId']
         hierarchy_name = hierarchy['hierarchyName']
+        key = subtree_key(parent_model_id, hierarchy_id, (property['propertyId'] for property in lower_level_properties))
+        # Subtrees being explored are not entered again, this guards against cycles
+        if any(subtree_key(*open_item['subtreeKey']) == key for open_item in worklist if 'subtreeKey' in open_item): continue
+        if 'subtreeKey' in item: subtrees[subtree_key(*item['subtreeKey'])][1].append(key)
+        # Subtrees already explored through another path are written again from their record
+        if key in subtrees:
+            write_subtree(key, reference_level)
+            continue
+
+        rows = []
         if reference_level == 1:
-            references.append([reference_level, 'Hierarchy Definition', '', '', hierarchy_name, hierarchy_id, parent_model_name, parent_model_id, '', '', '', ''])
+            rows.append([0, 'Hierarchy Definition', '', '', hierarchy_name, hierarchy_id, parent_model_name, parent_model_id, '', '', '', ''])
         properties = extract_dependent_properties(parent_model_id, hierarchy_id, lower_level_properties)
         for property in properties:
-            references.append([reference_level+1, 'Property', '', '', hierarchy_name, hierarchy_id, parent_model_name, parent_model_id, property['propertyName'], property['propertyId'], property['propertyType'], property['propertyDependentOn']])
-        print(f'\tChecking references at model: {get_asset_model_name(parent_model_id)}..')
-        if len(properties) > 0: get_references(models, parent_model_id, reference_level+1, properties)
+            rows.append([1, 'Property', '', '', hierarchy_name, hierarchy_id, parent_model_name, parent_model_id, property['propertyName'], property['propertyId'], property['propertyType'], property['propertyDependentOn']])
+        subtrees[key] = (rows, [])
+        write_subtree(key, reference_level)
+        if len(properties) > 0:
+            worklist.append({'modelId': parent_model_id, 'referenceLevel': reference_level+1, 'properties': properties, 'index': 0, 'subtreeKey': subtree_key_list(key)})
+    return state['referenceCount']
+
+# Retrieve references for the given model into a buffer, returns the number of references, the CSV rows and the progress messages
+def get_buffered_references(model_id, checkpointer=None):
+    csv_buffer = io.StringIO(newline='')
+    messages = []
+    reference_count = get_references(model_id, csv_buffer, checkpointer, log=messages.append)
+    return reference_count, csv_buffer.getvalue(), messages
+
+# Retrieve references for several models concurrently and write them to one CSV file, each row starting with its source model.
+# Up to twice as many models as workers are searched ahead of the model being written, in the given order.
+# The checkpoint records the number of models already written, the searches stopped by the time budget are done again on resume.
+def get_batch_references(model_ids, csv_file, workers=1, checkpointer=None, state=None):
+    csv_writer = csv.writer(csv_file)
+    if state is None: state = {'assetModelIds': model_ids, 'completedCount': 0, 'referenceCount': 0}
+    remaining_model_ids = model_ids[state['completedCount']:]
+    budget_check = BudgetCheck(checkpointer) if checkpointer else None
+
+    # Models written and size of the CSV file written so far
+    def checkpoint_state():
+        csv_file.flush()
+        state['csvOffset'] = csv_file.tell()
+        return state
+
+    # Search the references of a model, None when the time budget stopped the search.
+    # Each run completes the search of its first model before it can stop.
+    def search(index_model_id):
+        index, model_id = index_model_id
+        try:
+            return get_buffered_references(model_id, budget_check if index > 0 else None)
+        except TimeBudgetExhausted:
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = ordered_map(executor, search, enumerate(remaining_model_ids), 2 * workers)
+        try:
+            for model_id, result in zip(remaining_model_ids, results):
+                # The models written so far are saved to the checkpoint, a stopped search is done again by the resumed run
+                if result is None: checkpointer.check(checkpoint_state)
+                reference_count, rows, messages = result
+                for message in messages: print(message)
+                source_model = [get_asset_model_name(model_id), model_id]
+                for row in csv.reader(io.StringIO(rows, newline='')):
+                    csv_writer.writerow(source_model + row)
+                state['completedCount'] += 1
+                state['referenceCount'] += reference_count
+                if checkpointer: checkpointer.check(checkpoint_state)
+        finally:
+            # Searches not started yet are dropped when the run stops early
+            results.close()
+    return state['referenceCount']
+
+# Estimate the API calls and the wall time of a run from the model list, without describing the models.
+# Every model not loaded from the snapshot is described once, and the assets of each given model are listed from its first page.
+# Returns the estimate and the number of given models with more assets than the first page, whose other pages are not counted.
+def estimate_references(model_ids, workers=1, snapshot=None):
+    models = list_models()
+    refresh_count = len(models)
+    if snapshot:
+        up_to_date_count, refresh_count = model_catalog.use_snapshot(snapshot, models)
+        print(f'\nLoaded {up_to_date_count} models from snapshot, {refresh_count} models to refresh..')
+    paged_model_count = sum(1 for model_id in model_ids if 'nextToken' in list_assets_page(model_id))
+    calls = add_calls(operation_calls(sw_client), {'describe_asset_model': refresh_count})
+    return estimate_workload(sw_client, calls, workers), paged_model_count
+
+# Find the references of the given models in one account and region, run in a separate process with its own client and rate limits.
+# Models that do not exist in the account and region are skipped.
+# Returns the models found, the number of references and the CSV rows, each row starting with its source model.
+def get_target_references(region, profile, account_id, model_ids, workers, use_snapshot, report_file_path):
+    global sw_client, model_catalog, dependency_graph
+    start_time = time.time()
+    sw_client = create_client(workers, region, profile)
+    model_catalog = ModelCatalog(sw_client)
+    dependency_graph = DependencyGraph(model_catalog)
+    models = list_models()
+    if use_snapshot:
+        model_catalog.use_snapshot(ModelSnapshot(f'{root_dir}/{DATA_EXPORT_FOLDER_NAME}/{snapshot_file_name(account_id, region)}'), models)
+    build_parent_models_map(models, workers)
+    listed_model_ids = {model.id for model in models}
+    found_model_ids = [model_id for model_id in model_ids if model_id in listed_model_ids]
+    csv_buffer = io.StringIO(newline='')
+    reference_count = get_batch_references(found_model_ids, csv_buffer, workers)
+    if report_file_path:
+        sw_client.metrics.write_report(report_file_path.replace('_report.json', f'_{account_id}_{region}_report.json'), time.time() - start_time)
+    return found_model_ids, reference_count, csv_buffer.getvalue()
+
+# Find the references of the given models in several accounts and regions in parallel, and write them to one CSV file.
+# Each row starts with the region and account of its source model.
+def export_target_references(model_ids, regions, profiles, workers, use_snapshot, report_file_path):
+    targets = resolve_targets(regions, profiles)
+    print(f'\nFinding references for: {len(model_ids)} models in {len(targets)} accounts and regions in parallel..')
+    file_path = f'{root_dir}/{DATA_EXPORT_FOLDER_NAME}/regions_{csv_file_name_suffix}'
+    found_model_ids = set()
+    reference_count = 0
+    with open(file_path, mode='w', newline='') as csv_file:
+        csv_writer = csv.writer(csv_file)
+        csv_writer.writerow(TARGET_CSV_HEADER_PREFIX + BATCH_CSV_HEADER_PREFIX + CSV_HEADER)
+        for (region, profile, account_id), (target_model_ids, target_reference_count, rows) in run_targets(get_target_references, targets, model_ids, workers, use_snapshot, report_file_path):
+            print(f'\tRegion: {region}, Account: {account_id}, Models found: {len(target_model_ids)}, References: {target_reference_count}')
+            for row in csv.reader(io.StringIO(rows, newline='')):
+                csv_writer.writerow([region, account_id] + row)
+            found_model_ids.update(target_model_ids)
+            reference_count += target_reference_count
+    missing_model_ids = [model_id for model_id in model_ids if model_id not in found_model_ids]
+    if missing_model_ids:
+        print(f'\nModels not found in any account and region: {", ".join(missing_model_ids)}')
+    if reference_count > 0:
+        print(f'\nExported references to {file_path}')
+    else:
+        os.remove(file_path)
+        print(f'\nNo references found!')
 
 if __name__ == "__main__":
     script_start_time = time.time()
     # Create the argument parser
     parser = argparse.ArgumentParser()
     # Add the arguments
-    parser.add_argument("--asset-model-id", help="ID of the asset model")
+    parser.add_argument("--asset-model-id", help="ID of the asset model, several IDs write the references of all models to one CSV file", nargs='+')
+    parser.add_argument("--workers", help="Number of models described concurrently while building the map of references, and searched concurrently when several models are given", type=int, default=1)
+    parser.add_argument("--snapshot", help="Reuse the local snapshot of models and describe only changed models", action="store_true")
+    parser.add_argument("--report", help="Export a report of the API calls made by the script", action="store_true")
+    parser.add_argument("--time-budget", help="Maximum run time in seconds, the run is checkpointed and stops when reached", type=int, default=SCRIPT_TIMEOUT_SECONDS)
+    parser.add_argument("--resume", help="Checkpoint file of a previous run to resume")
+    parser.add_argument("--regions", help="Regions to search in parallel, one process per region and profile", nargs='+')
+    parser.add_argument("--profiles", help="AWS profiles (accounts) to search in parallel, one process per region and profile", nargs='+')
+    parser.add_argument("--estimate", help="Predict the API calls and the run time from the model list, without searching references", action="store_true")
     # Parse the arguments
     args = parser.parse_args()
     # Access the arguments
-    asset_model_id = args.asset_model_id
+    state = None
+    if args.resume:
+        state = load_checkpoint(args.resume)
+        asset_model_ids = state['assetModelIds'] if 'assetModelIds' in state else [state['assetModelId']]
+    else:
+        asset_model_ids = list(dict.fromkeys(args.asset_model_id or []))
+    batch = len(asset_model_ids) > 1
+    workers = args.workers
     # Validate the arguments
-    if valid_uuid(asset_model_id):
+    if workers < 1:
+        raise Exception("\nNumber of workers must be at least 1!")
+    if asset_model_ids and all(valid_uuid(asset_model_id) for asset_model_id in asset_model_ids):
         print(f'\nUser input successfully validated')
     else:
         raise Exception("\nInvalid Asset Model ID!")
-    
-    models = list_models()
-    print(f'\nBuilding a map of all hierarchy references for all models..')
-    build_parent_models_map(models)
-    model_name = get_asset_model_name(asset_model_id)
-
-    print(f'\nFinding references for model: {model_name}..')
-    get_references(models, asset_model_id, 1, [])
-    
-    if len(references) > 0: 
-        file_path = f'{root_dir}/{DATA_EXPORT_FOLDER_NAME}/{model_name}_{csv_file_name_suffix}'
-        csv_file = open(file_path, mode='w', newline='')
-        csv_writer = csv.writer(csv_file)
-        csv_writer.writerow(['Reference Level', 'Reference Type', 'Asset Name', 'Asset ID', 'Hierarchy Name', 'Hierarchy ID', 'Model Name', 'Model ID', 'Property Name', 'Property ID', 'Property Type', 'Property Dependent On'])
-        for reference in references: csv_writer.writerow(reference)
-        csv_file.close()
+    if args.estimate and (args.regions or args.profiles or args.resume):
+        raise Exception("\n--estimate cannot be combined with --regions, --profiles or --resume!")
+    if args.regions or args.profiles:
+        if args.resume:
+            raise Exception("\nRuns over several regions or profiles cannot be resumed!")
+        report_file_path = f'{root_dir}/{DATA_EXPORT_FOLDER_NAME}/regions_{csv_file_name_suffix}'.replace('.csv', '_report.json') if args.report else None
+        export_target_references(asset_model_ids, args.regions, args.profiles, workers, args.snapshot, report_file_path)
+        raise SystemExit(0)
+    sw_client = create_client(workers)
+    model_catalog = ModelCatalog(sw_client)
+    dependency_graph = DependencyGraph(model_catalog)
+    if args.report:
+        report_file_path = f'{root_dir}/{DATA_EXPORT_FOLDER_NAME}/{csv_file_name_suffix}'.replace('.csv', '_report.json')
+        report_on_exit(sw_client, report_file_path, script_start_time)
+    snapshot_file_path = None
+    if args.snapshot:
+        region, _, account_id = resolve_targets(None, None)[0]
+        snapshot_file_path = f'{root_dir}/{DATA_EXPORT_FOLDER_NAME}/{snapshot_file_name(account_id, region)}'
+    if args.estimate:
+        # A dry run reads the snapshot without updating it
+        snapshot = ModelSnapshot(snapshot_file_path, read_only=True) if args.snapshot else None
+        estimate, paged_model_count = estimate_references(asset_model_ids, workers, snapshot)
+        print_estimate(estimate, f'the references of {len(asset_model_ids)} models with {workers} workers')
+        if paged_model_count:
+            print(f'\t{paged_model_count} models have more than one page of assets, their other pages are not counted')
+        raise SystemExit(0)
+
+    # Models are listed and described once, whatever the number of models searched
+    models = iter_models()
+    if args.snapshot:
+        models = list(models)
+        snapshot = ModelSnapshot(snapshot_file_path)
+        up_to_date_count, refresh_count = model_catalog.use_snapshot(snapshot, models)
+        print(f'\nLoaded {up_to_date_count} models from snapshot, {refresh_count} models to refresh..')
+    if state:
+        # Models described before the checkpoint are not described again
+        for model in state.pop('describedModels', []): model_catalog.add(model)
+    model_name = f'{len(asset_model_ids)} models' if batch else get_asset_model_name(asset_model_ids[0])
+
+    if state:
+        # Continue the CSV file of the resumed run, dropping rows written after its checkpoint
+        file_path = state['csvFilePath']
+        checkpoint_file_path = args.resume
+    else:
+        file_path = f'{root_dir}/{DATA_EXPORT_FOLDER_NAME}/{"batch" if batch else model_name}_{csv_file_name_suffix}'
+        checkpoint_file_path = file_path.replace('.csv', '_checkpoint.json')
+        if batch:
+            state = {'assetModelIds': asset_model_ids, 'completedCount': 0, 'referenceCount': 0}
+        else:
+            state = new_references_state(asset_model_ids[0])
+        state['csvFilePath'] = file_path
+    checkpointer = Checkpointer(checkpoint_file_path, args.time_budget, script_start_time)
+    with open(file_path, mode='r+' if args.resume else 'w', newline='') as csv_file:
+        if args.resume:
+            csv_file.truncate(state['csvOffset'])
+            csv_file.seek(state['csvOffset'])
+        else:
+            csv.writer(csv_file).writerow(BATCH_CSV_HEADER_PREFIX + CSV_HEADER if batch else CSV_HEADER)
+
+        # Size of the CSV file written before the map is built
+        def map_state():
+            csv_file.flush()
+            state['csvOffset'] = csv_file.tell()
+            return state
+
+        # Every checkpoint holds the models described so far, so that a resumed run builds the map without describing them again
+        checkpointer.share_state(lambda: {'describedModels': model_catalog.responses()})
+        try:
+            print(f'\nBuilding a map of all hierarchy references and property dependencies for all models..')
+            build_parent_models_map(models, workers, checkpointer, map_state)
+            action = 'Resuming' if args.resume else 'Finding'
+            print(f'\n{action} references for: {model_name}..' if batch else f'\n{action} references for model: {model_name}..')
+            if batch:
+                reference_count = get_batch_references(asset_model_ids, csv_file, workers, checkpointer, state)
+            else:
+                reference_count = get_references(asset_model_ids[0], csv_file, checkpointer, state)
+        except TimeBudgetExhausted as error:
+            print(f'\n{error}. Exported references so far to {file_path}')
+            print(f'Resume with: python3 src/model_references.py --resume "{error.checkpoint_file_path}"')
+            raise SystemExit(1)
+        except BaseException:
+            # A run stopped by an error or an interrupt resumes from its last periodic checkpoint
+            if os.path.exists(checkpoint_file_path):
+                print(f'\nResume with: python3 src/model_references.py --resume "{checkpoint_file_path}"')
+            raise
+    checkpointer.remove()
+
+    if reference_count > 0:
         print(f'\nExported references to {file_path}')
     else:
-        print(f'\nNo references found!')
\ No newline at end of file
+        os.remove(file_path)
+        print(f'\nNo references found!')
+    print(f'\nModel catalog: {model_catalog.stats()}')
\ No newline at end of file
@@ -0,0 +1,72 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+import os
+import pathlib
+import sqlite3
+import threading
+
+SNAPSHOT_FILE_NAME = 'models_snapshot.db'
+
+# Snapshot file of an account and region, models of different accounts and regions are kept apart
+def snapshot_file_name(account_id, region):
+    return SNAPSHOT_FILE_NAME.replace('.db', f'_{account_id}_{region}.db')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS models (
+    model_id TEXT PRIMARY KEY,
+    name TEXT,
+    last_update_date TEXT,
+    status TEXT,
+    description TEXT
+);
+'''
+
+# Version of a model summary, the model is described again when its version changes
+def model_version(model_summary):
+    return str(model_summary['lastUpdateDate']), json.dumps(model_summary['status'], sort_keys=True, default=str)
+
+# Persistent SQLite snapshot of asset model descriptions, with the version of the summary they were described at.
+# A read-only snapshot is loaded but never updated, a missing read-only snapshot is empty.
+class ModelSnapshot:
+    def __init__(self, file_path, read_only=False):
+        self.file_path = file_path
+        self.read_only = read_only
+        self.lock = threading.Lock()
+        if read_only and os.path.exists(file_path):
+            self.connection = sqlite3.connect(f'{pathlib.Path(file_path).absolute().as_uri()}?mode=ro', uri=True, check_same_thread=False)
+        else:
+            self.connection = sqlite3.connect(':memory:' if read_only else file_path, check_same_thread=False)
+            self.connection.executescript(SCHEMA)
+
+    # Return the stored version of each model
+    def model_versions(self):
+        with self.lock:
+            rows = self.connection.execute('SELECT model_id, last_update_date, status FROM models').fetchall()
+        return {model_id: (last_update_date, status) for model_id, last_update_date, status in rows}
+
+    # Return the stored description of a model
+    def load_model(self, model_id):
+        with self.lock:
+            row = self.connection.execute('SELECT description FROM models WHERE model_id = ?', (model_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    # Store the description of a model together with the version of its summary
+    def save_model(self, version, model):
+        if self.read_only: return
+        model_id = model['assetModelId']
+        last_update_date, status = version
+        with self.lock, self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO models VALUES (?, ?, ?, ?, ?)',
+                                    (model_id, model['assetModelName'], last_update_date, status, json.dumps(model, default=str)))
+
+    # Remove models that no longer exist from the snapshot
+    def delete_models(self, model_ids):
+        if self.read_only: return
+        with self.lock, self.connection:
+            for model_id in model_ids:
+                self.connection.execute('DELETE FROM models WHERE model_id = ?', (model_id,))
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,60 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import queue
+import threading
+from collections import deque
+
+PREFETCH_SIZE = 2 # Items produced ahead of the consumer
+POLL_SECONDS = 0.1
+
+# Marks the end of a prefetched iterable
+END_OF_ITEMS = object()
+
+# Generate the items of an iterable produced by a background thread, at most max_size items ahead of the consumer.
+# Errors of the producer, including exits, are raised to the consumer, and the producer stops when the consumer stops early.
+def prefetch(iterable, max_size=PREFETCH_SIZE):
+    items = queue.Queue(maxsize=max_size)
+    stopped = threading.Event()
+
+    # Put an item in the queue, unless the consumer stopped
+    def put(item):
+        while not stopped.is_set():
+            try:
+                items.put(item, timeout=POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item): return
+            put(END_OF_ITEMS)
+        except BaseException as error:
+            put(error)
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item = items.get()
+            if item is END_OF_ITEMS: return
+            if isinstance(item, BaseException): raise item
+            yield item
+    finally:
+        stopped.set()
+
+# Generate function(item) for the items of an iterable, computed by an executor and returned in the order of the items.
+# At most window items are submitted ahead of the consumer, so that the iterable is consumed as results are used.
+def ordered_map(executor, function, iterable, window):
+    futures = deque()
+    try:
+        for item in iterable:
+            futures.append(executor.submit(function, item))
+            if len(futures) >= window:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+    finally:
+        for future in futures: future.cancel()
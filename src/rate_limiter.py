@@ -0,0 +1,35 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import threading
+import time
+
+# AWS IoT SiteWise API rate quotas (requests per second) used to pace each operation.
+# Adjust these values if the quotas of your account have been increased.
+API_RATE_LIMITS = {
+    'list_asset_models': 10,
+    'describe_asset_model': 30,
+    'list_assets': 30,
+    'describe_asset': 30,
+    'list_associated_assets': 30
+}
+
+# Thread-safe token bucket, each acquire() consumes one token and waits until it is available
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity else rate
+        self.tokens = self.capacity
+        self.timestamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    # Reserve a token and sleep until it is available, returns the time spent waiting
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.timestamp) * self.rate)
+            self.timestamp = now
+            self.tokens -= 1
+            wait_time = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait_time > 0: time.sleep(wait_time)
+        return wait_time
@@ -0,0 +1,136 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import random
+import time
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError, ConnectionError, HTTPClientError
+from rate_limiter import API_RATE_LIMITS, TokenBucket
+from instrumentation import ClientMetrics, response_size
+from pipeline import prefetch
+
+THROTTLING_ERROR_CODES = ('ThrottlingException', 'TooManyRequestsException')
+MAX_PAGE_SIZE = 250 # Largest maxResults accepted by the SiteWise list operations
+MAX_RETRIES = 8
+BASE_BACKOFF_SECONDS = 0.1
+MAX_BACKOFF_SECONDS = 10
+MIN_RATE = 0.5
+ADDITIVE_INCREASE = 0.5
+MULTIPLICATIVE_DECREASE = 0.5
+EXTRA_CONNECTIONS = 2 # Page prefetch thread and main thread, calling alongside the workers
+DEFAULT_POOL_CONNECTIONS = 10 # Connection pool size of botocore
+
+# Token bucket whose rate adapts to throttling (AIMD), starting at the operation quota
+class AdaptiveRateLimiter(TokenBucket):
+    def __init__(self, max_rate):
+        super().__init__(max_rate)
+        self.max_rate = max_rate
+
+    # Additively increase the rate after a successful call, up to the quota
+    def on_success(self):
+        with self.lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + ADDITIVE_INCREASE)
+                self.capacity = max(1, self.rate)
+
+    # Multiplicatively decrease the rate and drop any accumulated burst after a throttled call
+    def on_throttle(self):
+        with self.lock:
+            self.rate = max(MIN_RATE, self.rate * MULTIPLICATIVE_DECREASE)
+            self.capacity = max(1, self.rate)
+            self.tokens = min(self.tokens, 0)
+
+# Exponential backoff with full jitter for the given retry attempt
+def backoff_time(attempt):
+    return random.uniform(0, min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** attempt))
+
+# Return True if the error was raised because the request was throttled
+def is_throttling_error(error):
+    return isinstance(error, ClientError) and error.response.get('Error', {}).get('Code') in THROTTLING_ERROR_CODES
+
+# Return True if the request failed on a connection error or a server error, and can be retried as is
+def is_transient_error(error):
+    if isinstance(error, ClientError):
+        return error.response.get('ResponseMetadata', {}).get('HTTPStatusCode', 0) >= 500
+    return isinstance(error, (ConnectionError, HTTPClientError))
+
+# SiteWise client wrapper pacing and instrumenting every call of the rate limited operations.
+# Calls run at full speed until the service throttles them, then back off with jitter and recover.
+# The pacer is the only retry layer, the retries of botocore are turned off by create_client.
+class PacedClient:
+    def __init__(self, client, rate_limits=API_RATE_LIMITS, max_retries=MAX_RETRIES):
+        self.client = client
+        self.max_retries = max_retries
+        self.rate_limiters = {operation: AdaptiveRateLimiter(rate) for operation, rate in rate_limits.items()}
+        self.metrics = ClientMetrics()
+
+    # Calls to rate limited operations go through the pacer, other attributes come from the client
+    def __getattr__(self, operation):
+        if operation not in self.rate_limiters:
+            return getattr(self.client, operation)
+        return lambda **kwargs: self.call(operation, **kwargs)
+
+    # Call an API operation, retrying with backoff when it is throttled or fails on a transient error.
+    # Only throttling slows down the rate limiter of the operation.
+    def call(self, operation, **kwargs):
+        rate_limiter = self.rate_limiters[operation]
+        attempt = 0
+        while True:
+            self.metrics.record_pacing(operation, rate_limiter.acquire())
+            start_time = time.monotonic()
+            try:
+                response = getattr(self.client, operation)(**kwargs)
+            except (ClientError, ConnectionError, HTTPClientError) as error:
+                throttled = is_throttling_error(error)
+                self.metrics.record_call(operation, time.monotonic() - start_time, error=not throttled)
+                if not throttled and not is_transient_error(error): raise
+                if attempt >= self.max_retries:
+                    if throttled: self.metrics.record_throttle(operation, 0, retried=False)
+                    raise
+                backoff_seconds = backoff_time(attempt)
+                if throttled:
+                    rate_limiter.on_throttle()
+                    self.metrics.record_throttle(operation, backoff_seconds)
+                else:
+                    self.metrics.record_retry(operation, backoff_seconds)
+                time.sleep(backoff_seconds)
+                attempt += 1
+                continue
+            self.metrics.record_call(operation, time.monotonic() - start_time, response_size(response))
+            rate_limiter.on_success()
+            return response
+
+    # Generate the pages of results of a list operation, using the largest page size
+    def iterate_pages(self, operation, result_key, **kwargs):
+        kwargs.setdefault('maxResults', MAX_PAGE_SIZE)
+        # Paginate
+        while True:
+            response = self.call(operation, **kwargs)
+            yield response[result_key]
+            # Check if there are more pages of results
+            if 'nextToken' in response:
+                kwargs['nextToken'] = response['nextToken']
+            else:
+                break
+
+    # Generate the results of a list operation one page at a time.
+    # With prefetch_pages, up to that many next pages are fetched in the background while the results of the current page are processed.
+    def iterate(self, operation, result_key, prefetch_pages=0, **kwargs):
+        pages = self.iterate_pages(operation, result_key, **kwargs)
+        if prefetch_pages: pages = prefetch(pages, prefetch_pages)
+        for page in pages:
+            yield from page
+
+    # Retrieve all results of a list operation
+    def paginate(self, operation, result_key, **kwargs):
+        return list(self.iterate(operation, result_key, **kwargs))
+
+# Create a paced SiteWise client with a connection pool sized for the given number of workers,
+# with a connection for the page prefetch thread and one for the main thread, so that no request waits for a connection.
+# The region and profile default to those of the AWS configuration.
+# Each request is sent once by botocore, so that throttled requests reach the pacer, which retries them.
+def create_client(workers=1, region=None, profile=None):
+    session = boto3.Session(region_name=region, profile_name=profile)
+    config = Config(max_pool_connections=max(DEFAULT_POOL_CONNECTIONS, workers + EXTRA_CONNECTIONS), retries={'mode': 'standard', 'total_max_attempts': 1})
+    return PacedClient(session.client('iotsitewise', config=config))
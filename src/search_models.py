@@ -2,27 +2,44 @@
 # SPDX-License-Identifier: MIT-0
 
 # Usage:
-# python3 src/search_models.py [--no-properties] [--no-assets] [--no-hierarchy-definitions] [--no-hierarchy-references]
+# python3 src/search_models.py [--no-properties] [--no-assets] [--no-hierarchy-definitions] [--no-hierarchy-references] [--workers <value>] [--snapshot] [--report] [--regions <value> [<value> ...]] [--profiles <value> [<value> ...]] [--estimate]
 #
 # Examples:
 # python3 src/search_models.py
 # python3 src/search_models.py --no-properties
 # python3 src/search_models.py --no-assets --no-hierarchy-definitions
 # python3 src/search_models.py --no-properties --no-assets --no-hierarchy-definitions --no-hierarchy-references
+# python3 src/search_models.py --no-assets --workers 16
+# python3 src/search_models.py --no-properties --snapshot
+# python3 src/search_models.py --no-assets --workers 16 --report
+# python3 src/search_models.py --no-assets --regions us-east-1 eu-west-1 --profiles dev prod
+# python3 src/search_models.py --no-properties --no-assets --workers 16 --estimate
 
-import boto3
 import time
 import argparse
 import uuid
 import csv
 import os
+import random
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from request_pacing import create_client, MAX_PAGE_SIZE
+from pipeline import ordered_map, PREFETCH_SIZE
+from model_catalog import ModelCatalog, summary_from_response
+from model_snapshot import ModelSnapshot, snapshot_file_name
+from instrumentation import report_on_exit
+from fan_out import resolve_targets, run_targets
+from cost_estimate import ESTIMATE_SAMPLE_SIZE, operation_calls, calls_since, add_calls, estimate_workload, print_estimate
 
 src_dir = os.path.abspath(os.path.dirname(__file__))
 root_dir = os.path.abspath(os.path.dirname(src_dir))
 
-sw_client = boto3.client('iotsitewise')
+# Client and catalog of the scanned account and region, created once the arguments are parsed, or by the process of each target
+sw_client = None
+model_catalog = None
 DATA_EXPORT_FOLDER_NAME = 'exported_data'
 csv_file_path = f'{root_dir}/{DATA_EXPORT_FOLDER_NAME}/filtered_models_{int(time.time())}.csv'
+report_file_path = csv_file_path.replace('.csv', '_report.json')
 
 # Validate if the provided value is a valid UUID
 def valid_uuid(value):
@@ -32,80 +49,116 @@ def valid_uuid(value):
     except ValueError:
         return False
 
-# Retrieve all models from AWS IoT SiteWise
-def list_models():
-    all_models = []
-    next_token = None
-    # Retrieve list of asset models using pagination
-    while True:
-        if next_token:
-            response = sw_client.list_asset_models(nextToken=next_token)
-        else:
-            response = sw_client.list_asset_models()
-        asset_models = response['assetModelSummaries']
-        all_models += asset_models
-        # Check if there are more pages of results
-        if 'nextToken' in response:
-            next_token = response['nextToken']
-        else:
-            break   
-        time.sleep(1) # Limit to a maximum of 1 ListAssetModels API calls per second
-    return all_models
+# Generate all models from AWS IoT SiteWise as compact summaries, the next pages are fetched while the models are analyzed
+def iter_models():
+    for model_summary in sw_client.iterate('list_asset_models', 'assetModelSummaries', prefetch_pages=PREFETCH_SIZE):
+        yield summary_from_response(model_summary)
 
 # Return True if the provided model has associated assets
 def model_has_assets(model_id):
     has_assets = False
-    response = sw_client.list_assets(assetModelId=model_id)
+    response = sw_client.list_assets(assetModelId=model_id, maxResults=1)
     assets = response['assetSummaries']
     if len(assets) > 0: has_assets = True
     return has_assets
 
-# Filter models based on the provided filtering criteria
-def filter_models(no_hierarchy_references_filter,no_hierarchy_definitions_filter,no_properties_filter,no_assets_filter):
-    filter_count_map = {}
-    parent_models_map = {}
-    active_filter_count = no_hierarchy_references_filter+no_hierarchy_definitions_filter+no_properties_filter+no_assets_filter
+# Describe a model, without its properties unless the properties filter needs them anyway
+def describe_model(model_id, no_properties_filter):
+    if no_properties_filter: return model_catalog.describe(model_id)
+    return model_catalog.describe_without_properties(model_id)
+
+# Return True if the model matches all active filters.
+# Filters are evaluated from the cheapest to the most expensive and evaluation stops at the first failing filter.
+def model_matches_filters(model_id, no_hierarchy_references_filter, no_hierarchy_definitions_filter, no_properties_filter, no_assets_filter):
+    # Hierarchy references, from the parent model edges added to the catalog before the analysis
+    if no_hierarchy_references_filter and not model_catalog.is_referenced(model_id): return False
+    # Hierarchy definitions, from a model description without properties
+    if no_hierarchy_definitions_filter and len(describe_model(model_id, no_properties_filter).hierarchies) > 0: return False
+    # Properties, from the full model description
+    if no_properties_filter and len(model_catalog.properties(model_id)) > 0: return False
+    # Assets, from a single asset of the model
+    if no_assets_filter and model_has_assets(model_id): return False
+    return True
+
+# Filter models based on the provided filtering criteria.
+# Models are analyzed as they are listed, with up to twice as many models in flight as workers.
+# The snapshot and the hierarchy references filter need all models before the analysis, their summaries are kept in memory then.
+# ListAssetModels returns no total, progress is shown as a percentage only when the number of models is known before the analysis.
+def filter_models(no_hierarchy_references_filter,no_hierarchy_definitions_filter,no_properties_filter,no_assets_filter,workers=1,snapshot=None):
     filtered_models = []
-    models = list_models()
-    print(f'\nAnalyzing models..')
-    # Build maps for each model
-    for idx, model in enumerate(models):
-        model_id = model['id']
-        response = sw_client.describe_asset_model(
-            assetModelId=model_id)
-        asset_model_properties = response['assetModelProperties']
-        asset_model_hierarchies = response['assetModelHierarchies']
-        filter_match_count = 0
-        
-        if no_hierarchy_definitions_filter and len(asset_model_hierarchies) == 0: filter_match_count += 1
-        if no_properties_filter and len(asset_model_properties) == 0: filter_match_count += 1
-        if no_assets_filter and not model_has_assets(model_id): filter_match_count += 1
-        filter_count_map[model_id] = filter_match_count
-
-        for hierarchy in asset_model_hierarchies:
-            child_model_id = hierarchy['childAssetModelId']
-            if child_model_id in parent_models_map:
-                parent_models_map[child_model_id].append(model_id)
+    models = iter_models()
+    model_count = None
+    if snapshot:
+        models = list(models)
+        model_count = len(models)
+        up_to_date_count, refresh_count = model_catalog.use_snapshot(snapshot, models)
+        print(f'\nLoaded {up_to_date_count} models from snapshot, {refresh_count} models to refresh..')
+    else:
+        # The number of models is known when they all fit in the first page
+        first_models = list(itertools.islice(models, MAX_PAGE_SIZE + 1))
+        if len(first_models) <= MAX_PAGE_SIZE: model_count = len(first_models)
+        models = itertools.chain(first_models, models)
+    window = 2 * workers
+    # API calls are paced by the per-operation rate limiters of the client
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Models referenced in hierarchy definitions of other models
+        if no_hierarchy_references_filter:
+            print(f'\nBuilding a map of all hierarchy references for all models..')
+            listed_models = []
+            for model, description in ordered_map(executor, lambda model: (model, describe_model(model.id, no_properties_filter)), models, window):
+                listed_models.append(model)
+                model_catalog.add_parent_edges(description)
+            models = listed_models
+            model_count = len(models)
+
+        print(f'\nAnalyzing models..')
+        results = ordered_map(executor, lambda model: (model, model_matches_filters(model.id, no_hierarchy_references_filter,
+                                                                                    no_hierarchy_definitions_filter, no_properties_filter, no_assets_filter)), models, window)
+        # Results are returned in model order, so progress and output stay deterministic
+        for idx, (model, matches_filters) in enumerate(results):
+            if matches_filters: filtered_models.append(model)
+            if model_count:
+                progress = round((idx+1) / model_count * 100, 1)
+                print(f"\tProgress: {progress}%")
             else:
-                parent_models_map[child_model_id] = [model_id]
-        
-        progress = round((idx+1) / len(models) * 100, 1)
-        print(f"\tProgress: {progress}%")
-        time.sleep(1/30) # Limit to a maximum of 30 DescribeAssetModel and 30 ListAssets API calls per second
-    
-    # Update the maps and filter the models
-    for idx, model in enumerate(models):
-         model_id = model['id']
-         if model_id in parent_models_map: 
-             if model_id in filter_count_map: 
-                filter_count_map[model_id] += 1
-             else:
-                filter_count_map[model_id] = 1
-         if active_filter_count == 0 or (model_id in filter_count_map and active_filter_count == filter_count_map[model_id]):
-            filtered_models.append(model)
-                                                                         
+                print(f"\tProgress: model {idx+1}")
+
     return filtered_models
 
+# Estimate the API calls and the wall time of filter_models, from the model list and the analysis of a sample of models.
+# The calls of the sample are scaled to all models. Models of the sample are assumed to be referenced by other models,
+# as references are only known once all models are described, so the estimate is an upper bound with the references filter.
+def estimate_filter_models(no_hierarchy_references_filter,no_hierarchy_definitions_filter,no_properties_filter,no_assets_filter,workers=1,snapshot=None):
+    models = list(iter_models())
+    listing_calls = operation_calls(sw_client)
+    if snapshot:
+        up_to_date_count, refresh_count = model_catalog.use_snapshot(snapshot, models)
+        print(f'\nLoaded {up_to_date_count} models from snapshot, {refresh_count} models to refresh..')
+    sample = random.sample(models, min(ESTIMATE_SAMPLE_SIZE, len(models)))
+    print(f'\nAnalyzing a sample of {len(sample)} of {len(models)} models..')
+    for model in sample:
+        # The map of hierarchy references describes every model
+        if no_hierarchy_references_filter: describe_model(model.id, no_properties_filter)
+        model_matches_filters(model.id, False, no_hierarchy_definitions_filter, no_properties_filter, no_assets_filter)
+    sample_calls = calls_since(sw_client, listing_calls)
+    calls = add_calls(listing_calls, sample_calls, len(models) / len(sample) if sample else 0)
+    return estimate_workload(sw_client, calls, workers), len(models)
+
+# Filter the models of one account and region, run in a separate process with its own client and rate limits.
+# Returns the names and IDs of the filtered models.
+def filter_target_models(region, profile, account_id, filters, workers, use_snapshot, use_report):
+    global sw_client, model_catalog
+    start_time = time.time()
+    sw_client = create_client(workers, region, profile)
+    model_catalog = ModelCatalog(sw_client)
+    snapshot = None
+    if use_snapshot:
+        snapshot = ModelSnapshot(f'{root_dir}/{DATA_EXPORT_FOLDER_NAME}/{snapshot_file_name(account_id, region)}')
+    filtered_models = filter_models(*filters, workers, snapshot)
+    if use_report:
+        sw_client.metrics.write_report(report_file_path.replace('_report.json', f'_{account_id}_{region}_report.json'), time.time() - start_time)
+    return [(model.name, model.id) for model in filtered_models]
+
 if __name__ == "__main__":
     script_start = time.time()
     # Create the argument parser
@@ -115,6 +168,12 @@ if __name__ == "__main__":
     parser.add_argument("--no-hierarchy-definitions", help="Filter models without any hierarchy definitions", action="store_true")
     parser.add_argument("--no-properties", help="Filter models with no properties", action="store_true")
     parser.add_argument("--no-assets", help="Filter models with no corresponding assets", action="store_true")
+    parser.add_argument("--workers", help="Number of models analyzed concurrently", type=int, default=1)
+    parser.add_argument("--snapshot", help="Reuse the local snapshot of models and describe only changed models", action="store_true")
+    parser.add_argument("--report", help="Export a report of the API calls made by the script", action="store_true")
+    parser.add_argument("--regions", help="Regions to scan in parallel, one process per region and profile", nargs='+')
+    parser.add_argument("--profiles", help="AWS profiles (accounts) to scan in parallel, one process per region and profile", nargs='+')
+    parser.add_argument("--estimate", help="Predict the API calls and the run time from a sample of models, without analyzing all models", action="store_true")
     # Parse the arguments
     args = parser.parse_args()
     # Access the arguments
@@ -122,9 +181,42 @@ if __name__ == "__main__":
     no_hierarchy_definitions_filter = args.no_hierarchy_definitions
     no_properties_filter = args.no_properties
     no_assets_filter = args.no_assets
-    
-    filtered_models = filter_models(no_hierarchy_references_filter,no_hierarchy_definitions_filter,no_properties_filter,no_assets_filter)
-    filtered_model_count = len(filtered_models)
+    workers = args.workers
+    filters = (no_hierarchy_references_filter, no_hierarchy_definitions_filter, no_properties_filter, no_assets_filter)
+    # Validate the arguments
+    if workers < 1:
+        raise Exception("\nNumber of workers must be at least 1!")
+    if args.estimate and (args.regions or args.profiles):
+        raise Exception("\n--estimate cannot be combined with --regions or --profiles!")
+
+    if args.regions or args.profiles:
+        # Each account and region is scanned by its own process, the runtime is that of the slowest one
+        targets = resolve_targets(args.regions, args.profiles)
+        print(f'\nScanning {len(targets)} accounts and regions in parallel..')
+        csv_header = ['Region', 'Account ID', 'Model Name', 'Model ID']
+        rows = []
+        for (region, profile, account_id), target_models in run_targets(filter_target_models, targets, filters, workers, args.snapshot, args.report):
+            print(f'\tRegion: {region}, Account: {account_id}, Models with provided conditions: {len(target_models)}')
+            rows += [[region, account_id, model_name, model_id] for model_name, model_id in target_models]
+    else:
+        sw_client = create_client(workers)
+        model_catalog = ModelCatalog(sw_client)
+        if args.report:
+            report_on_exit(sw_client, report_file_path, script_start)
+        snapshot = None
+        if args.snapshot:
+            region, _, account_id = resolve_targets(None, None)[0]
+            # A dry run reads the snapshot without updating it
+            snapshot = ModelSnapshot(f'{root_dir}/{DATA_EXPORT_FOLDER_NAME}/{snapshot_file_name(account_id, region)}', read_only=args.estimate)
+        if args.estimate:
+            estimate, model_count = estimate_filter_models(*filters, workers, snapshot)
+            print_estimate(estimate, f'the analysis of {model_count} models with {workers} workers')
+            raise SystemExit(0)
+        filtered_models = filter_models(*filters, workers, snapshot)
+        csv_header = ['Model Name', 'Model ID']
+        rows = [[model.name, model.id] for model in filtered_models]
+
+    filtered_model_count = len(rows)
     if filtered_model_count == 0:
         print(f'\nNo models with provided conditions are found!')
     else:
@@ -132,13 +224,13 @@ if __name__ == "__main__":
         
         csv_file = open(csv_file_path, mode='w', newline='')
         csv_writer = csv.writer(csv_file)
-        csv_writer.writerow(['Model Name', 'Model ID'])
+        csv_writer.writerow(csv_header)
 
-        for model in filtered_models:
-            model_name = model['name']
-            model_id = model['id']
-            print(f'\tModel Name: {model_name}, Model Id: {model_id}')
-            csv_writer.writerow([model_name, model_id])
+        for row in rows:
+            model_name, model_id = row[-2:]
+            location = f'Region: {row[0]}, Account: {row[1]}, ' if len(row) > 2 else ''
+            print(f'\t{location}Model Name: {model_name}, Model Id: {model_id}')
+            csv_writer.writerow(row)
         csv_file.close()
         print(f'\nExported references to {csv_file_path}')
     print(f'\n** Total execution time: {round((time.time() - script_start))} seconds **')
\ No newline at end of file
@@ -0,0 +1,59 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# Shared fixtures of the tests, which run the utilities against the offline stand-in for AWS IoT SiteWise (src/fake_sitewise.py)
+
+import os
+import sys
+import random
+import pytest
+
+src_dir = os.path.join(os.path.abspath(os.path.dirname(os.path.dirname(__file__))), 'src')
+sys.path.insert(0, src_dir)
+
+from fake_sitewise import FakeSiteWiseClient, generate_account, generate_diamond_account
+from request_pacing import PacedClient
+from rate_limiter import API_RATE_LIMITS
+from checkpoint import Checkpointer, TimeBudgetExhausted, load_checkpoint
+
+UNPACED_RATE_LIMIT = 1000000
+
+# Small synthetic account, with a model without properties, hierarchies nor assets so that every filter selects models
+@pytest.fixture(scope='session')
+def account():
+    account = generate_account(model_count=24, hierarchy_depth=3, fan_out=2, metric_density=2, seed=1)
+    account.add_model(random.Random('empty model'), 'Empty model')
+    return account
+
+# Account whose model hierarchy is a chain of diamonds, parent models are reached through several paths
+@pytest.fixture(scope='session')
+def diamond_account():
+    return generate_diamond_account(depth=5, seed=1)
+
+# Samples of the estimates are drawn from a fixed seed
+@pytest.fixture(autouse=True)
+def random_seed():
+    random.seed(1)
+
+# Fake client and the paced client wrapping it, without pacing so that the tests do not wait for the quotas
+def new_client(account, throttle_rate=0.0, latency=0.0):
+    fake_client = FakeSiteWiseClient(account, latency, throttle_rate, seed=1)
+    return fake_client, PacedClient(fake_client, {operation: UNPACED_RATE_LIMIT for operation in API_RATE_LIMITS})
+
+# Run a checkpointed run until it completes, each run exhausting its time budget at its first check and resuming
+# from the checkpoint of the previous run. run(checkpointer, state) is given no state for the first run. Returns the number of runs.
+def run_until_complete(run, checkpoint_file_path):
+    state = None
+    run_count = 0
+    while True:
+        run_count += 1
+        try:
+            run(Checkpointer(checkpoint_file_path, -1), state)
+            return run_count
+        except TimeBudgetExhausted:
+            state = load_checkpoint(checkpoint_file_path)
+
+# Read a file as bytes
+def read_bytes(file_path):
+    with open(file_path, mode='rb') as file:
+        return file.read()
@@ -0,0 +1,192 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import csv
+import json
+import pytest
+import asset_hierarchy
+from hierarchy_traversal import HierarchyTraversal, ForestCrawl, AncestorResolver, iter_hierarchy_edges
+from fake_sitewise import generate_account
+from benchmark import benchmark_forest_estimate, benchmark_hierarchy_estimate, benchmark_ancestor_paths_estimate
+from checkpoint import Checkpointer, TimeBudgetExhausted, load_checkpoint
+from conftest import new_client, run_until_complete, read_bytes
+
+MISSING_ASSET_ID = '00000000-0000-0000-0000-000000000000'
+
+# Checkpointer counting the checks of its time budget
+class CountingCheckpointer(Checkpointer):
+    def __init__(self, file_path):
+        super().__init__(file_path, 3600)
+        self.check_count = 0
+
+    def check(self, state_function):
+        self.check_count += 1
+        super().check(state_function)
+
+# Depth of an asset from its root asset, root assets are at depth 1
+def asset_depth(account, asset_id):
+    depth = 1
+    while asset_id in account.parent_assets:
+        asset_id = account.parent_assets[asset_id][0]
+        depth += 1
+    return depth
+
+# (parent asset ID, asset ID, hierarchy ID, depth) edges of the hierarchy below an asset, read from the account.
+# Assets are expanded down to max_depth levels below the root asset, like the traversals.
+def baseline_edges(account, asset_id, max_depth=None, depth=1):
+    edges = []
+    if max_depth is not None and depth > max_depth: return edges
+    for hierarchy in account.assets[asset_id]['hierarchies']:
+        for child_asset_id in account.child_assets.get((asset_id, hierarchy['id']), []):
+            edges.append((asset_id, child_asset_id, hierarchy['id'], depth+1))
+            edges += baseline_edges(account, child_asset_id, max_depth, depth+1)
+    return edges
+
+# Edges of a tree built by the level-parallel traversal
+def tree_edges(node):
+    edges = []
+    for child in node.children:
+        edges.append((node.asset_id, child.asset_id, child.hierarchy_id, child.depth))
+        edges += tree_edges(child)
+    return edges
+
+# Edges generated by the streaming export and the forest crawl
+def generated_edges(edges):
+    return [(edge['parentAssetId'], edge['assetId'], edge['hierarchyId'], edge['depth']) for edge in edges]
+
+@pytest.mark.parametrize('max_depth', [None, 1, 2])
+@pytest.mark.parametrize('concurrency', [1, 4])
+def test_traversal_matches_baseline(account, max_depth, concurrency):
+    for root_asset_id in account.root_asset_ids:
+        tree = HierarchyTraversal(new_client(account)[1], concurrency, max_depth).run(root_asset_id)
+        assert sorted(tree_edges(tree)) == sorted(baseline_edges(account, root_asset_id, max_depth))
+
+# Edges are generated depth-first, in the order of the hierarchies and of the child assets
+@pytest.mark.parametrize('max_depth', [None, 1, 2])
+def test_streamed_edges_match_baseline(account, max_depth):
+    for root_asset_id in account.root_asset_ids:
+        edges = generated_edges(iter_hierarchy_edges(new_client(account)[1], root_asset_id, max_depth))
+        assert edges == baseline_edges(account, root_asset_id, max_depth)
+
+def test_export_formats_hold_the_same_edges(account, tmp_path):
+    root_asset_id = account.root_asset_ids[0]
+    edges = list(iter_hierarchy_edges(new_client(account)[1], root_asset_id))
+    assert asset_hierarchy.export_hierarchy(iter_hierarchy_edges(new_client(account)[1], root_asset_id), tmp_path / 'hierarchy.csv', 'csv') == len(edges)
+    assert asset_hierarchy.export_hierarchy(iter_hierarchy_edges(new_client(account)[1], root_asset_id), tmp_path / 'hierarchy.jsonl', 'jsonl') == len(edges)
+    with open(tmp_path / 'hierarchy.csv', newline='') as csv_file:
+        rows = list(csv.reader(csv_file))
+    with open(tmp_path / 'hierarchy.jsonl') as jsonl_file:
+        assert [json.loads(line) for line in jsonl_file] == edges
+    assert rows[0] == ['Parent Asset ID', 'Asset ID', 'Asset Name', 'Asset Model ID', 'Hierarchy ID', 'Depth']
+    assert rows[1:] == [[str(value) for value in edge.values()] for edge in edges]
+
+# A traversal stopped at every check of its time budget and resumed from its checkpoint builds the same tree as a single run
+def test_resumed_traversal_is_identical(account, tmp_path):
+    root_asset_id = account.root_asset_ids[0]
+    trees = []
+
+    def run(checkpointer, state):
+        trees.append(HierarchyTraversal(new_client(account)[1], 4, None, checkpointer).run(root_asset_id, state))
+
+    assert run_until_complete(run, tmp_path / 'checkpoint.json') > 1
+    assert tree_edges(trees[-1]) == tree_edges(HierarchyTraversal(new_client(account)[1], 4).run(root_asset_id))
+
+# The time budget is checked as each node completes, instead of once per level or per chunk of nodes.
+# Assets without hierarchies are not expanded.
+def test_traversal_checks_budget_per_node(account, tmp_path):
+    root_asset_id = account.root_asset_ids[0]
+    checkpointer = CountingCheckpointer(tmp_path / 'checkpoint.json')
+    HierarchyTraversal(new_client(account)[1], 1, None, checkpointer).run(root_asset_id)
+    edges = baseline_edges(account, root_asset_id)
+    assert checkpointer.check_count == 1 + sum(1 for edge in edges if account.assets[edge[1]]['hierarchies'])
+
+# Once the time budget is exhausted, the nodes of the level that are not started yet are left for the resumed run
+def test_traversal_stops_starting_nodes_on_budget(account, tmp_path):
+    root_asset_id = account.root_asset_ids[0]
+    with pytest.raises(TimeBudgetExhausted):
+        HierarchyTraversal(new_client(account)[1], 2, None, Checkpointer(tmp_path / 'checkpoint.json', -1)).run(root_asset_id)
+    state = load_checkpoint(tmp_path / 'checkpoint.json')
+    level = state['tree']['children']
+    fake_client, client = new_client(account)
+    with pytest.raises(TimeBudgetExhausted):
+        HierarchyTraversal(client, 2, None, Checkpointer(tmp_path / 'checkpoint.json', -1)).run(root_asset_id, state)
+    # At most the first two nodes of the second level were started
+    assert len(level) > 2
+    assert 0 < fake_client.calls['list_associated_assets'] <= sum(len(node['hierarchies']) for node in level[:2])
+    assert 0 < len([node for node in load_checkpoint(tmp_path / 'checkpoint.json')['tree']['children'] if node['hierarchies'] == []]) <= 2
+
+# An export stopped after every edge and resumed from its checkpoint writes the same file as a single run
+@pytest.mark.parametrize('export_format', ['csv', 'jsonl'])
+def test_resumed_hierarchy_export_is_identical(account, export_format, tmp_path):
+    root_asset_id = account.root_asset_ids[0]
+    asset_hierarchy.export_hierarchy(iter_hierarchy_edges(new_client(account)[1], root_asset_id), tmp_path / 'hierarchy', export_format)
+
+    def run(checkpointer, state):
+        if state is None: state = {}
+        edges = iter_hierarchy_edges(new_client(account)[1], root_asset_id, None, state)
+        asset_hierarchy.export_hierarchy(edges, tmp_path / 'resumed_hierarchy', export_format, checkpointer, state)
+
+    assert run_until_complete(run, tmp_path / 'checkpoint.json') == len(baseline_edges(account, root_asset_id)) + 1
+    assert read_bytes(tmp_path / 'resumed_hierarchy') == read_bytes(tmp_path / 'hierarchy')
+
+# Root assets are generated without a parent asset and without a hierarchy
+def test_forest_crawl_matches_baseline(account):
+    expected_edges = [('', root_asset_id, '', 1) for root_asset_id in account.root_asset_ids]
+    for root_asset_id in account.root_asset_ids:
+        expected_edges += baseline_edges(account, root_asset_id)
+    state = {}
+    edges = generated_edges(ForestCrawl(new_client(account)[1], 4).iter_edges(list(account.models), state))
+    assert sorted(edges) == sorted(expected_edges)
+    assert sum(state['depthCounts']) == len(account.assets)
+
+def test_resumed_forest_export_is_identical(account, tmp_path):
+    model_ids = list(account.models)
+    asset_hierarchy.export_hierarchy(ForestCrawl(new_client(account)[1], 4).iter_edges(model_ids, {}), tmp_path / 'forest.csv', 'csv')
+
+    def run(checkpointer, state):
+        if state is None: state = {}
+        edges = ForestCrawl(new_client(account)[1], 4).iter_edges(model_ids, state)
+        asset_hierarchy.export_hierarchy(edges, tmp_path / 'resumed_forest.csv', 'csv', checkpointer, state)
+
+    assert run_until_complete(run, tmp_path / 'checkpoint.json') == len(account.assets) + 1
+    assert read_bytes(tmp_path / 'resumed_forest.csv') == read_bytes(tmp_path / 'forest.csv')
+
+# Assets that do not exist get an empty path, the paths of the other assets are still resolved
+def test_ancestor_paths_match_baseline(account):
+    asset_ids = list(account.parent_assets) + [MISSING_ASSET_ID]
+    paths = AncestorResolver(new_client(account)[1], 4).resolve(asset_ids)
+    for asset_id, asset_name, path_ids, path_names in paths[:-1]:
+        assert asset_name == account.assets[asset_id]['name']
+        assert path_ids[-1] == asset_id and path_ids[0] in account.root_asset_ids
+        assert len(path_ids) == asset_depth(account, asset_id)
+        assert all(account.parent_assets[child_id][0] == parent_id for parent_id, child_id in zip(path_ids, path_ids[1:]))
+        assert path_names == [account.assets[path_id]['name'] for path_id in path_ids]
+    assert paths[-1] == (MISSING_ASSET_ID, None, None, None)
+
+# The root assets of every model are listed, and the hierarchies below a sample of them are extrapolated to all of them
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_estimate_forest_bounds(seed):
+    account = generate_account(seed=seed)
+    fake_client, client = new_client(account)
+    asset_count = sum(1 for edge in ForestCrawl(client, 10).iter_edges(list(account.models), {}))
+    predicted_calls = benchmark_forest_estimate(new_client(account)[1], 10)
+    assert asset_count == len(account.assets)
+    assert predicted_calls['list_assets'] == fake_client.calls['list_assets']
+    assert 0.8 <= predicted_calls['list_associated_assets'] / fake_client.calls['list_associated_assets'] <= 1.25
+
+def test_estimate_hierarchy_bounds(account):
+    root_asset_id = account.root_asset_ids[0]
+    fake_client, client = new_client(account)
+    sum(1 for edge in iter_hierarchy_edges(client, root_asset_id))
+    predicted_calls = benchmark_hierarchy_estimate(new_client(account)[1], root_asset_id)
+    assert predicted_calls['describe_asset'] == fake_client.calls['describe_asset']
+    assert 0.8 <= predicted_calls['list_associated_assets'] / fake_client.calls['list_associated_assets'] <= 1.25
+
+# Sampled paths are scaled to all assets as if they shared no ancestors, so the estimate is an upper bound
+def test_estimate_ancestor_paths_bounds(account):
+    asset_ids = list(account.parent_assets)
+    fake_client, client = new_client(account)
+    AncestorResolver(client, 4).resolve(asset_ids)
+    predicted_calls = benchmark_ancestor_paths_estimate(new_client(account)[1], asset_ids, 4)
+    for operation, call_count in fake_client.calls.items():
+        assert predicted_calls[operation] >= call_count
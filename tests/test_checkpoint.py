@@ -0,0 +1,32 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import pytest
+from checkpoint import Checkpointer, BudgetCheck, TimeBudgetExhausted, load_checkpoint
+
+# The state is saved every interval without stopping the run, with the state shared by the stages of the run
+def test_state_is_saved_every_interval(tmp_path):
+    checkpointer = Checkpointer(tmp_path / 'checkpoint.json', 3600, interval=-1)
+    checkpointer.share_state(lambda: {'describedModels': ['model']})
+    checkpointer.check(lambda: {'step': 1})
+    assert load_checkpoint(tmp_path / 'checkpoint.json') == {'step': 1, 'describedModels': ['model']}
+    checkpointer.check(lambda: {'step': 2})
+    assert load_checkpoint(tmp_path / 'checkpoint.json')['step'] == 2
+    checkpointer.remove()
+    assert not (tmp_path / 'checkpoint.json').exists()
+
+def test_state_is_not_saved_within_interval(tmp_path):
+    Checkpointer(tmp_path / 'checkpoint.json', 3600).check(lambda: {'step': 1})
+    assert not (tmp_path / 'checkpoint.json').exists()
+
+def test_state_is_saved_when_budget_is_exhausted(tmp_path):
+    checkpointer = Checkpointer(tmp_path / 'checkpoint.json', -1)
+    with pytest.raises(TimeBudgetExhausted):
+        checkpointer.check(lambda: {'step': 1})
+    assert load_checkpoint(tmp_path / 'checkpoint.json') == {'step': 1}
+
+# Tasks stop on the time budget without saving, their run saves its own state
+def test_budget_check_stops_without_saving(tmp_path):
+    with pytest.raises(TimeBudgetExhausted):
+        BudgetCheck(Checkpointer(tmp_path / 'checkpoint.json', -1, interval=-1)).check(lambda: {'step': 1})
+    assert not (tmp_path / 'checkpoint.json').exists()
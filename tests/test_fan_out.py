@@ -0,0 +1,53 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import pytest
+import fan_out
+from fan_out import resolve_targets, run_targets
+
+ACCOUNT_IDS = {None: '111111111111', 'dev': '111111111111', 'prod': '222222222222'}
+
+# Session of a profile, in the region given or in the default region of the profile
+class FakeSession:
+    def __init__(self, region_name=None, profile_name=None):
+        self.region_name = region_name or ('eu-west-1' if profile_name != 'no-region' else None)
+        self.profile_name = profile_name
+
+    def client(self, service_name):
+        return self
+
+    def get_caller_identity(self):
+        return {'Account': ACCOUNT_IDS[self.profile_name]}
+
+@pytest.fixture(autouse=True)
+def fake_session(monkeypatch):
+    monkeypatch.setattr(fan_out.boto3, 'Session', FakeSession)
+
+# Scan of a target, run in a process of its own
+def scan(region, profile, account_id, model_count):
+    print(f'Scanning {region}..')
+    if region == 'failing-region': raise ValueError('Access denied')
+    return [f'{account_id}/{region}/{index}' for index in range(model_count)]
+
+# Pairs of regions and profiles reaching the same account and region are scanned once
+def test_resolve_targets_keeps_distinct_accounts_and_regions():
+    targets = resolve_targets(['us-east-1', 'eu-west-1'], [None, 'dev', 'prod'])
+    assert targets == [('us-east-1', None, '111111111111'), ('eu-west-1', None, '111111111111'),
+                       ('us-east-1', 'prod', '222222222222'), ('eu-west-1', 'prod', '222222222222')]
+    assert resolve_targets(None, None) == [('eu-west-1', None, '111111111111')]
+
+def test_resolve_targets_requires_region():
+    with pytest.raises(Exception, match='No region configured for profile no-region'):
+        resolve_targets(None, ['no-region'])
+
+# Results are generated in the order of the targets, with the arguments given to every target
+def test_run_targets_keeps_target_order():
+    targets = [('us-east-1', None, '111111111111'), ('eu-west-1', 'prod', '222222222222'), ('ap-south-1', None, '111111111111')]
+    assert list(run_targets(scan, targets, 2)) == [(target, scan(*target, 2)) for target in targets]
+
+def test_run_targets_names_failed_target():
+    targets = [('us-east-1', None, '111111111111'), ('failing-region', 'prod', '222222222222')]
+    results = run_targets(scan, targets, 1)
+    assert next(results)[0] == targets[0]
+    with pytest.raises(Exception, match='Scan of region failing-region with profile prod failed: Access denied'):
+        next(results)
@@ -0,0 +1,236 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import csv
+import io
+import pytest
+import model_references
+from checkpoint import Checkpointer, load_checkpoint
+from benchmark import setup_model_references, benchmark_references_estimate
+from model_catalog import ModelCatalog
+from dependency_graph import DependencyGraph
+from conftest import new_client, run_until_complete, read_bytes
+
+# Map of the parent models of each model, built like the first release of model_references.py.
+# A parent model with several hierarchies for the same child model is listed once, the first release listed it once per hierarchy
+# and wrote the references of each of its hierarchies as many times.
+def baseline_parent_models_map(client):
+    parent_models_map = {}
+    for model in client.paginate('list_asset_models', 'assetModelSummaries'):
+        response = client.describe_asset_model(assetModelId=model['id'], excludeProperties=True)
+        for hierarchy in response['assetModelHierarchies']:
+            parent_model_ids = parent_models_map.setdefault(hierarchy['childAssetModelId'], [])
+            if model['id'] not in parent_model_ids: parent_model_ids.append(model['id'])
+    return parent_models_map
+
+# Hierarchies of the parent models referencing a model, as in the first release
+def baseline_hierarchy_references(client, parent_models_map, child_model_id):
+    hierarchy_references = []
+    for parent_id in parent_models_map.get(child_model_id, []):
+        response = client.describe_asset_model(assetModelId=parent_id, excludeProperties=True)
+        for model_hierarchy in response['assetModelHierarchies']:
+            if model_hierarchy['childAssetModelId'] == child_model_id:
+                hierarchy_references.append({'assetModelId': parent_id, 'assetModelName': response['assetModelName'],
+                                             'hierarchyName': model_hierarchy['name'], 'hierarchyId': model_hierarchy['id']})
+    return hierarchy_references
+
+# Name of a property of a model, from the model description as in the first release
+def baseline_property_name(client, model_id, property_id):
+    property_name = ''
+    for item in client.describe_asset_model(assetModelId=model_id)['assetModelProperties']:
+        if item['id'] == property_id: property_name = item['name']
+    return property_name
+
+# Metrics of a model rolling up the lower level properties through a hierarchy, found by the linear scan of the first release
+def baseline_dependent_properties(client, model_id, hierarchy_id, lower_level_properties):
+    properties = []
+    lower_level_property_ids = [property['propertyId'] for property in lower_level_properties]
+    lower_level_property_names = [property['propertyName'] for property in lower_level_properties]
+    response = client.describe_asset_model(assetModelId=model_id)
+    asset_model_properties = response['assetModelProperties']
+    asset_model_hierarchies = response['assetModelHierarchies']
+    for property in asset_model_properties:
+        property_type_name = list(property['type'].keys())[0]
+        if property_type_name != 'metric' or 'variables' not in property['type'][property_type_name]: continue
+        include_property = False
+        dependent_on = ''
+        for variable in property['type'][property_type_name]['variables']:
+            property_value_obj = variable['value']
+            independent_property_id = property_value_obj['propertyId']
+            if 'hierarchyId' in property_value_obj:
+                if independent_property_id in lower_level_property_ids:
+                    dependent_on += lower_level_property_names[lower_level_property_ids.index(independent_property_id)] + ','
+                else:
+                    child_model_id = ''
+                    for item in asset_model_hierarchies:
+                        if item['id'] == property_value_obj['hierarchyId']:
+                            child_model_id = item['childAssetModelId']
+                            break
+                    dependent_on += (baseline_property_name(client, child_model_id, independent_property_id) if child_model_id else '') + ','
+            else:
+                independent_property_name = ''
+                for item in asset_model_properties:
+                    if item['id'] == independent_property_id: independent_property_name = item['name']
+                dependent_on += independent_property_name + ','
+            if ('hierarchyId' in property_value_obj and property_value_obj['hierarchyId'] == hierarchy_id and
+                    (independent_property_id in lower_level_property_ids or len(lower_level_properties) == 0)):
+                include_property = True
+        if include_property:
+            properties.append({'propertyName': property['name'], 'propertyType': property_type_name, 'propertyId': property['id'],
+                               'propertyDependentOn': dependent_on})
+    return properties
+
+# Rows of the references of a model found by the recursive search of the first release, which follows every path, as read back from a CSV file
+def baseline_references(client, parent_models_map, model_id, reference_level=1, lower_level_properties=[]):
+    rows = []
+    if reference_level == 1:
+        for asset in client.paginate('list_assets', 'assetSummaries', assetModelId=model_id):
+            rows.append(['1', 'Asset', asset['name'], asset['id'], '', '', '', '', '', '', '', ''])
+    for hierarchy in baseline_hierarchy_references(client, parent_models_map, model_id):
+        if reference_level == 1:
+            rows.append(['1', 'Hierarchy Definition', '', '', hierarchy['hierarchyName'], hierarchy['hierarchyId'], hierarchy['assetModelName'], hierarchy['assetModelId'], '', '', '', ''])
+        properties = baseline_dependent_properties(client, hierarchy['assetModelId'], hierarchy['hierarchyId'], lower_level_properties)
+        for property in properties:
+            rows.append([str(reference_level+1), 'Property', '', '', hierarchy['hierarchyName'], hierarchy['hierarchyId'], hierarchy['assetModelName'], hierarchy['assetModelId'],
+                         property['propertyName'], property['propertyId'], property['propertyType'], property['propertyDependentOn']])
+        if len(properties) > 0: rows += baseline_references(client, parent_models_map, hierarchy['assetModelId'], reference_level+1, properties)
+    return rows
+
+# Reference rows of a model found by the first release, on a client of its own
+def baseline_rows(account, model_id):
+    client = new_client(account)[1]
+    return baseline_references(client, baseline_parent_models_map(client), model_id)
+
+# Rows of the CSV written by get_references
+def references_rows(model_id):
+    csv_buffer = io.StringIO(newline='')
+    model_references.get_references(model_id, csv_buffer)
+    return list(csv.reader(io.StringIO(csv_buffer.getvalue(), newline='')))
+
+# Models of the lowest level of the account, which are referenced by the models of every level above
+def lowest_level_model_ids(account):
+    return [model_id for model_id, model in account.models.items() if model['assetModelName'].startswith('Model L3-')]
+
+# Write the CSV rows to a file as the csv module does
+def write_rows(file_path, rows):
+    with open(file_path, mode='w', newline='') as csv_file:
+        csv.writer(csv_file).writerows(rows)
+
+# (model ID, hierarchy ID, child model ID) of every hierarchy definition of the account
+def account_hierarchies(account):
+    return [(model_id, hierarchy['id'], hierarchy['childAssetModelId'])
+            for model_id, model in account.models.items() for hierarchy in model['assetModelHierarchies']]
+
+@pytest.mark.parametrize('account_name', ['account', 'diamond_account'])
+def test_dependent_properties_match_baseline(account_name, request):
+    account = request.getfixturevalue(account_name)
+    setup_model_references(new_client(account)[1])
+    baseline_client = new_client(account)[1]
+    for model_id, hierarchy_id, child_model_id in account_hierarchies(account):
+        child_properties = [{'propertyId': item['id'], 'propertyName': item['name']} for item in account.models[child_model_id]['assetModelProperties']]
+        # All metrics of the hierarchy, the metrics of each lower level property, and those of all of them
+        for lower_level_properties in [[]] + [[property] for property in child_properties] + [child_properties]:
+            assert (model_references.extract_dependent_properties(model_id, hierarchy_id, lower_level_properties) ==
+                    baseline_dependent_properties(baseline_client, model_id, hierarchy_id, lower_level_properties))
+
+def test_references_match_baseline(account):
+    setup_model_references(new_client(account)[1])
+    for model_id in list(account.models):
+        assert references_rows(model_id) == baseline_rows(account, model_id)
+
+# Parent models reached through several paths are written once per path
+def test_references_of_diamonds_match_baseline(diamond_account):
+    setup_model_references(new_client(diamond_account)[1])
+    for model_id in diamond_account.models:
+        assert references_rows(model_id) == baseline_rows(diamond_account, model_id)
+    assert len(references_rows(next(iter(diamond_account.models)))) > 2 * len(diamond_account.models)
+
+# A search stopped at every check of its time budget and resumed from its checkpoint writes the same file as a single run
+def test_resumed_references_are_identical(diamond_account, tmp_path):
+    setup_model_references(new_client(diamond_account)[1])
+    model_id = next(iter(diamond_account.models))
+    file_path = tmp_path / 'references.csv'
+
+    def run(checkpointer, state):
+        with open(file_path, mode='r+' if state else 'w', newline='') as csv_file:
+            if state:
+                csv_file.truncate(state['csvOffset'])
+                csv_file.seek(state['csvOffset'])
+            model_references.get_references(model_id, csv_file, checkpointer, state)
+
+    run_count = run_until_complete(run, tmp_path / 'checkpoint.json')
+    write_rows(tmp_path / 'baseline.csv', baseline_rows(diamond_account, model_id))
+    assert run_count > 1
+    assert read_bytes(file_path) == read_bytes(tmp_path / 'baseline.csv')
+
+# A search interrupted between two checks resumes from its last periodic checkpoint, and writes the same file as a single run
+def test_interrupted_references_resume_from_last_checkpoint(diamond_account, tmp_path):
+    setup_model_references(new_client(diamond_account)[1])
+    model_id = next(iter(diamond_account.models))
+    file_path = tmp_path / 'references.csv'
+    messages = []
+
+    # Interrupt the search after a few progress messages, as Ctrl-C would
+    def log(message):
+        messages.append(message)
+        if len(messages) == 20: raise KeyboardInterrupt
+
+    with open(file_path, mode='w', newline='') as csv_file:
+        with pytest.raises(KeyboardInterrupt):
+            model_references.get_references(model_id, csv_file, Checkpointer(tmp_path / 'checkpoint.json', 3600, interval=-1), log=log)
+    state = load_checkpoint(tmp_path / 'checkpoint.json')
+    with open(file_path, mode='r+', newline='') as csv_file:
+        csv_file.truncate(state['csvOffset'])
+        csv_file.seek(state['csvOffset'])
+        model_references.get_references(model_id, csv_file, Checkpointer(tmp_path / 'checkpoint.json', 3600), state, log=messages.append)
+    write_rows(tmp_path / 'baseline.csv', baseline_rows(diamond_account, model_id))
+    assert read_bytes(file_path) == read_bytes(tmp_path / 'baseline.csv')
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_batch_references_match_single_searches(account, workers):
+    setup_model_references(new_client(account)[1])
+    model_ids = lowest_level_model_ids(account)
+    csv_buffer = io.StringIO(newline='')
+    reference_count = model_references.get_batch_references(model_ids, csv_buffer, workers)
+    expected_rows = [[model_references.get_asset_model_name(model_id), model_id] + row for model_id in model_ids for row in baseline_rows(account, model_id)]
+    assert list(csv.reader(io.StringIO(csv_buffer.getvalue(), newline=''))) == expected_rows
+    assert reference_count == len(expected_rows)
+
+def test_resumed_batch_references_are_identical(account, tmp_path):
+    setup_model_references(new_client(account)[1])
+    model_ids = lowest_level_model_ids(account)
+    with open(tmp_path / 'batch.csv', mode='w', newline='') as csv_file:
+        model_references.get_batch_references(model_ids, csv_file, 2)
+    file_path = tmp_path / 'resumed_batch.csv'
+
+    def run(checkpointer, state):
+        with open(file_path, mode='r+' if state else 'w', newline='') as csv_file:
+            if state:
+                csv_file.truncate(state['csvOffset'])
+                csv_file.seek(state['csvOffset'])
+            model_references.get_batch_references(model_ids, csv_file, 2, checkpointer, state)
+
+    # Each run writes one model, the last run finds the batch complete
+    assert run_until_complete(run, tmp_path / 'checkpoint.json') == len(model_ids) + 1
+    assert read_bytes(file_path) == read_bytes(tmp_path / 'batch.csv')
+
+# Models described by the workers are not described again by the main thread, which looks up the properties of the child models
+@pytest.mark.parametrize('workers', [1, 4])
+def test_parent_models_map_describes_models_once(account, workers):
+    fake_client, client = new_client(account, latency=0.001)
+    model_references.sw_client = client
+    model_references.model_catalog = ModelCatalog(client)
+    model_references.dependency_graph = DependencyGraph(model_references.model_catalog)
+    model_references.build_parent_models_map(model_references.list_models(), workers)
+    assert fake_client.calls['describe_asset_model'] == len(account.models)
+
+# Each model is described once, and the assets of the given model are listed from their first page
+def test_estimate_references_bounds(account):
+    fake_client, client = new_client(account)
+    setup_model_references(client)
+    model_id = lowest_level_model_ids(account)[0]
+    references_rows(model_id)
+    predicted_calls = benchmark_references_estimate(new_client(account)[1], model_id)
+    assert predicted_calls['list_asset_models'] == fake_client.calls['list_asset_models']
+    assert predicted_calls['describe_asset_model'] == fake_client.calls['describe_asset_model']
+    assert predicted_calls['list_assets'] <= fake_client.calls['list_assets']
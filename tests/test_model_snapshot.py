@@ -0,0 +1,63 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import datetime
+import pytest
+from fake_sitewise import generate_account
+from model_catalog import ModelCatalog, summary_from_response, response_from_record
+from model_snapshot import ModelSnapshot
+from conftest import new_client
+
+# Account of its own, as the tests update and delete its models
+@pytest.fixture
+def snapshot_account():
+    return generate_account(model_count=12, hierarchy_depth=3, fan_out=1, metric_density=1, seed=2)
+
+# Describe all models of the account with a catalog using the snapshot.
+# Returns the DescribeAssetModel calls made, and the models of the catalog as responses.
+def describe_with_snapshot(account, file_path, read_only=False):
+    fake_client, client = new_client(account)
+    catalog = ModelCatalog(client)
+    snapshot = ModelSnapshot(file_path, read_only)
+    catalog.use_snapshot(snapshot, [summary_from_response(model_summary) for model_summary in client.iterate('list_asset_models', 'assetModelSummaries')])
+    responses = {model_id: response_from_record(catalog.describe(model_id)) for model_id in account.models}
+    snapshot.close()
+    return fake_client.calls['describe_asset_model'], responses
+
+def test_unchanged_models_are_loaded_from_snapshot(snapshot_account, tmp_path):
+    describe_count, responses = describe_with_snapshot(snapshot_account, tmp_path / 'snapshot.db')
+    assert describe_count == len(snapshot_account.models)
+    assert describe_with_snapshot(snapshot_account, tmp_path / 'snapshot.db') == (0, responses)
+
+# Models whose last update date or state changed are described again, and saved again to the snapshot
+def test_changed_models_are_described_again(snapshot_account, tmp_path):
+    describe_with_snapshot(snapshot_account, tmp_path / 'snapshot.db')
+    updated_model, pending_model = list(snapshot_account.models.values())[:2]
+    updated_model['assetModelName'] = 'Updated model'
+    updated_model['assetModelLastUpdateDate'] += datetime.timedelta(days=1)
+    pending_model['assetModelStatus'] = {'state': 'UPDATING'}
+    describe_count, responses = describe_with_snapshot(snapshot_account, tmp_path / 'snapshot.db')
+    assert describe_count == 2
+    assert responses[updated_model['assetModelId']]['assetModelName'] == 'Updated model'
+    # The model being updated is described on every run until it is active again
+    assert describe_with_snapshot(snapshot_account, tmp_path / 'snapshot.db')[0] == 1
+
+def test_deleted_models_are_removed_from_snapshot(snapshot_account, tmp_path):
+    describe_with_snapshot(snapshot_account, tmp_path / 'snapshot.db')
+    deleted_model_id = next(iter(snapshot_account.models))
+    del snapshot_account.models[deleted_model_id]
+    fake_client, client = new_client(snapshot_account)
+    snapshot = ModelSnapshot(tmp_path / 'snapshot.db')
+    ModelCatalog(client).use_snapshot(snapshot, [summary_from_response(model_summary) for model_summary in client.iterate('list_asset_models', 'assetModelSummaries')])
+    assert set(snapshot.model_versions()) == set(snapshot_account.models)
+    assert snapshot.load_model(deleted_model_id) is None
+
+# Estimates read the snapshot without writing to it, and a missing snapshot is not created
+def test_read_only_snapshot_is_not_updated(snapshot_account, tmp_path):
+    assert describe_with_snapshot(snapshot_account, tmp_path / 'missing.db', read_only=True)[0] == len(snapshot_account.models)
+    assert not (tmp_path / 'missing.db').exists()
+    describe_with_snapshot(snapshot_account, tmp_path / 'snapshot.db')
+    updated_model = next(iter(snapshot_account.models.values()))
+    updated_model['assetModelLastUpdateDate'] += datetime.timedelta(days=1)
+    assert describe_with_snapshot(snapshot_account, tmp_path / 'snapshot.db', read_only=True)[0] == 1
+    assert describe_with_snapshot(snapshot_account, tmp_path / 'snapshot.db', read_only=True)[0] == 1
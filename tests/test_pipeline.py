@@ -0,0 +1,68 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import time
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from pipeline import prefetch, ordered_map, POLL_SECONDS
+
+# Items generated by a producer, raising an error after them
+def failing_items(count):
+    for index in range(count): yield index
+    raise ValueError('Page listing failed')
+
+def test_prefetch_keeps_item_order():
+    assert list(prefetch(range(100))) == list(range(100))
+
+# Errors of the producer are raised to the consumer after the items produced before them
+def test_prefetch_forwards_errors():
+    items = []
+    with pytest.raises(ValueError, match='Page listing failed'):
+        for item in prefetch(failing_items(5)): items.append(item)
+    assert items == list(range(5))
+
+# The producer stops when the consumer stops early, at most max_size items ahead of the items consumed
+def test_prefetch_stops_with_consumer():
+    produced = []
+
+    def items():
+        for index in range(1000):
+            produced.append(index)
+            yield index
+
+    pages = prefetch(items(), 2)
+    assert next(pages) == 0
+    pages.close()
+    time.sleep(3 * POLL_SECONDS)
+    assert len(produced) <= 4
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_ordered_map_keeps_item_order(workers):
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        assert list(ordered_map(executor, lambda item: item * 2, range(50), 2 * workers)) == [item * 2 for item in range(50)]
+
+# At most window items are consumed from the iterable ahead of the result being used
+def test_ordered_map_bounds_items_ahead():
+    consumed = []
+
+    def items():
+        for index in range(20):
+            consumed.append(index)
+            yield index
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = ordered_map(executor, lambda item: item, items(), 3)
+        for result in results:
+            assert len(consumed) <= result + 3
+        assert consumed == list(range(20))
+
+def test_ordered_map_forwards_errors():
+    def check(item):
+        if item == 3: raise ValueError('Describe failed')
+        return item
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = ordered_map(executor, check, range(10), 4)
+        assert [next(results) for _ in range(3)] == [0, 1, 2]
+        with pytest.raises(ValueError, match='Describe failed'):
+            next(results)
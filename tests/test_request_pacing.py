@@ -0,0 +1,87 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import pytest
+import request_pacing
+from botocore.exceptions import ClientError
+from fake_sitewise import FakeSiteWiseClient
+from rate_limiter import API_RATE_LIMITS, TokenBucket
+from request_pacing import PacedClient, create_client, EXTRA_CONNECTIONS
+from conftest import new_client
+
+# Fake client failing the first calls of DescribeAssetModel with a server error
+class FlakyClient(FakeSiteWiseClient):
+    def __init__(self, account, failure_count):
+        super().__init__(account)
+        self.failure_count = failure_count
+
+    def describe_asset_model(self, assetModelId, excludeProperties=False):
+        if self.failure_count > 0:
+            self.failure_count -= 1
+            self.request('describe_asset_model')
+            raise ClientError({'Error': {'Code': 'InternalFailureException', 'Message': 'Internal failure'},
+                               'ResponseMetadata': {'HTTPStatusCode': 500}}, 'DescribeAssetModel')
+        return super().describe_asset_model(assetModelId, excludeProperties)
+
+# Retries are not delayed, so that the tests do not wait for the backoff
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(request_pacing, 'backoff_time', lambda attempt: 0)
+
+# Calls within the burst of the bucket do not wait, the next call waits for a token
+def test_token_bucket_waits_beyond_burst():
+    bucket = TokenBucket(100)
+    assert sum(bucket.acquire() for _ in range(100)) == 0
+    assert 0 < bucket.acquire() <= 0.011
+
+# The pool has a connection for each worker, the page prefetch thread and the main thread
+@pytest.mark.parametrize('workers, pool_connections', [(1, 10), (8, 10), (16, 16 + EXTRA_CONNECTIONS)])
+def test_create_client_pool_size(workers, pool_connections):
+    assert create_client(workers, region='us-east-1').client.meta.config.max_pool_connections == pool_connections
+
+# Every throttled call is retried, and the report holds the calls and throttles received by the service
+def test_report_matches_throttled_calls(account):
+    fake_client, client = new_client(account, throttle_rate=0.3)
+    for model in client.paginate('list_asset_models', 'assetModelSummaries'):
+        client.describe_asset_model(assetModelId=model['id'])
+        client.paginate('list_assets', 'assetSummaries', assetModelId=model['id'])
+    operations = client.metrics.report()['operations']
+    assert sum(fake_client.throttles.values()) > 0
+    assert fake_client.calls['describe_asset_model'] == len(account.models) + fake_client.throttles['describe_asset_model']
+    for operation, call_count in fake_client.calls.items():
+        assert operations[operation]['calls'] == call_count
+        assert operations[operation]['throttles'] == fake_client.throttles[operation]
+        assert operations[operation]['retries'] == fake_client.throttles[operation]
+        assert operations[operation]['errors'] == 0
+
+def test_throttled_call_fails_after_max_retries(account):
+    fake_client = FakeSiteWiseClient(account, throttle_rate=1.0)
+    client = PacedClient(fake_client, max_retries=2)
+    with pytest.raises(ClientError) as error:
+        client.list_asset_models()
+    metrics = client.metrics.report()['operations']['list_asset_models']
+    assert error.value.response['Error']['Code'] == 'ThrottlingException'
+    assert (fake_client.calls['list_asset_models'], metrics['calls'], metrics['throttles'], metrics['retries']) == (3, 3, 3, 2)
+    assert client.rate_limiters['list_asset_models'].rate < API_RATE_LIMITS['list_asset_models']
+
+# Server errors are retried without slowing down the rate limiter of the operation
+def test_transient_errors_are_retried(account):
+    fake_client = FlakyClient(account, failure_count=2)
+    client = PacedClient(fake_client)
+    model_id = next(iter(account.models))
+    assert client.describe_asset_model(assetModelId=model_id)['assetModelId'] == model_id
+    metrics = client.metrics.report()['operations']['describe_asset_model']
+    assert (metrics['calls'], metrics['retries'], metrics['errors'], metrics['throttles']) == (3, 2, 2, 0)
+    assert client.rate_limiters['describe_asset_model'].rate == API_RATE_LIMITS['describe_asset_model']
+
+def test_client_errors_are_not_retried(account):
+    fake_client, client = new_client(account)
+    with pytest.raises(ClientError) as error:
+        client.describe_asset_model(assetModelId='00000000-0000-0000-0000-000000000000')
+    metrics = client.metrics.report()['operations']['describe_asset_model']
+    assert error.value.response['Error']['Code'] == 'ResourceNotFoundException'
+    assert (fake_client.calls['describe_asset_model'], metrics['retries'], metrics['errors']) == (1, 0, 1)
+
+# botocore sends each request once, so that throttled requests reach the pacer
+def test_create_client_turns_off_botocore_retries():
+    assert create_client(region='us-east-1').client.meta.config.retries['total_max_attempts'] == 1
@@ -0,0 +1,71 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import itertools
+import pytest
+import search_models
+from model_catalog import ModelCatalog
+from conftest import new_client
+
+ALL_FILTERS = list(itertools.product([False, True], repeat=4))
+
+# IDs of the models filtered by the first release of search_models.py, which describes every model and counts the matching filters.
+# Referenced models are counted as matching the references filter only when it is active, as fixed since the first release.
+def baseline_filter_models(client, no_hierarchy_references_filter, no_hierarchy_definitions_filter, no_properties_filter, no_assets_filter):
+    active_filter_count = no_hierarchy_references_filter + no_hierarchy_definitions_filter + no_properties_filter + no_assets_filter
+    filter_count_map = {}
+    parent_models_map = {}
+    models = client.paginate('list_asset_models', 'assetModelSummaries')
+    for model in models:
+        response = client.describe_asset_model(assetModelId=model['id'])
+        filter_match_count = 0
+        if no_hierarchy_definitions_filter and len(response['assetModelHierarchies']) == 0: filter_match_count += 1
+        if no_properties_filter and len(response['assetModelProperties']) == 0: filter_match_count += 1
+        if no_assets_filter and len(client.list_assets(assetModelId=model['id'])['assetSummaries']) == 0: filter_match_count += 1
+        filter_count_map[model['id']] = filter_match_count
+        for hierarchy in response['assetModelHierarchies']:
+            parent_models_map.setdefault(hierarchy['childAssetModelId'], []).append(model['id'])
+    if no_hierarchy_references_filter:
+        for model_id in parent_models_map: filter_count_map[model_id] += 1
+    return [model['id'] for model in models if active_filter_count == 0 or filter_count_map[model['id']] == active_filter_count]
+
+# IDs of the models filtered by search_models.py
+def filtered_model_ids(client, filters, workers=1, snapshot=None):
+    search_models.sw_client = client
+    search_models.model_catalog = ModelCatalog(client)
+    return [model.id for model in search_models.filter_models(*filters, workers, snapshot)]
+
+@pytest.mark.parametrize('filters', ALL_FILTERS)
+@pytest.mark.parametrize('workers', [1, 4])
+def test_filter_models_matches_baseline(account, filters, workers):
+    fake_client, client = new_client(account)
+    assert filtered_model_ids(client, filters, workers) == baseline_filter_models(new_client(account)[1], *filters)
+
+def test_filter_models_with_throttling(account):
+    filters = (True, True, True, True)
+    fake_client, client = new_client(account, throttle_rate=0.2)
+    assert filtered_model_ids(client, filters, workers=4) == baseline_filter_models(new_client(account)[1], *filters)
+    assert sum(fake_client.throttles.values()) > 0
+
+# Each model is described at most once, without its properties unless the properties filter needs them
+def test_filter_models_describes_models_once(account):
+    fake_client, client = new_client(account)
+    filtered_model_ids(client, (True, True, False, True))
+    assert fake_client.calls['describe_asset_model'] == len(account.models)
+    assert fake_client.calls['list_asset_models'] == 1
+
+# Every model is described once without the references filter, so the estimate of the calls is exact.
+# With the references filter, the sample is assumed to be referenced, so the estimate is an upper bound.
+@pytest.mark.parametrize('filters', [(False, True, False, False), (False, True, True, True), (True, True, True, True)])
+def test_estimate_filter_models_bounds(account, filters):
+    fake_client, client = new_client(account)
+    filtered_model_ids(client, filters)
+    search_models.sw_client = new_client(account)[1]
+    search_models.model_catalog = ModelCatalog(search_models.sw_client)
+    estimate, model_count = search_models.estimate_filter_models(*filters)
+    predicted_calls = {operation: metrics['calls'] for operation, metrics in estimate['operations'].items()}
+    assert model_count == len(account.models)
+    assert predicted_calls['list_asset_models'] == fake_client.calls['list_asset_models']
+    assert predicted_calls['describe_asset_model'] == fake_client.calls['describe_asset_model']
+    if filters[0]:
+        assert predicted_calls.get('list_assets', 0) >= fake_client.calls['list_assets']